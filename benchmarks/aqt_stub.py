@@ -0,0 +1,41 @@
+"""
+Stand-in for Anki's aqt package, so that benchmarks can import the add-on the way
+Anki does at startup, without a Qt application.
+"""
+
+import sys
+import types
+
+
+class Stub:
+    """Accepts any construction, call, attribute access or subclassing."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return Stub()
+
+    def __getattr__(self, name):
+        return Stub()
+
+
+def _module(name: str, names=()) -> types.ModuleType:
+    module = types.ModuleType(name)
+    module.__getattr__ = lambda attribute: Stub
+    # Star imports only see the names listed here.
+    module.__all__ = list(names)
+    for attribute in names:
+        setattr(module, attribute, Stub)
+    sys.modules[name] = module
+    return module
+
+
+def install() -> None:
+    """Make `import aqt` and its submodules the add-on uses return stubs, with a
+    main window so that the add-on registers its menu action."""
+    aqt = _module("aqt")
+    aqt.mw = Stub()
+    aqt.qt = _module("aqt.qt", ("QAction", "QDialog", "qconnect"))
+    aqt.operations = _module("aqt.operations")
+    aqt.utils = _module("aqt.utils")
@@ -0,0 +1,87 @@
+"""
+Compare the memory used by parsed review histories.
+
+Measures the compact jpdb.ReviewHistory representation against the previous
+list-of-Review-dataclasses one on a synthetic export (1M reviews by default), and
+the peak of streaming the export with Vocabulary.iter_parse.
+"""
+
+import argparse
+import collections
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from jpdb_anki_import import jpdb
+
+from . import synthetic
+
+
+def _legacy_parse(filename) -> list:
+    """Vocabulary.parse as it was before ReviewHistory, for comparison."""
+    with open(filename, "rb") as review_file:
+        export = json.load(review_file)
+
+    def build(reviews):
+        return sorted(
+            (jpdb.Review.from_dict(r) for r in reviews), key=lambda x: x.timestamp
+        )
+
+    by_vid = {}
+    for key in ("cards_vocabulary_en_jp", "cards_vocabulary_jp_en"):
+        for vocab in export.get(key, []):
+            entry = by_vid.setdefault(vocab["vid"], {})
+            entry[key] = build(vocab["reviews"])
+    return list(by_vid.values())
+
+
+def measure(parse, filename) -> dict:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = parse(filename)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return {"seconds": elapsed, "retained_bytes": retained, "peak_bytes": peak}
+
+
+def run(reviews: int = 1_000_000, reviews_per_card: float = 20.0) -> dict:
+    vocabulary = max(1, int(reviews / reviews_per_card / 1.5))
+    with tempfile.TemporaryDirectory() as tmp:
+        export = os.path.join(tmp, "export.json")
+        total = synthetic.generate_export(export, vocabulary, reviews_per_card)
+        return {
+            "reviews": total,
+            "vocabulary": vocabulary,
+            "legacy": measure(_legacy_parse, export),
+            "parse": measure(jpdb.Vocabulary.parse, export),
+            "iter_parse": measure(
+                lambda f: list(jpdb.Vocabulary.iter_parse(f)), export
+            ),
+            # Words dropped as soon as they are yielded: what remains of the peak is
+            # the first review list, held until the second one has been read.
+            "iter_parse_stream": measure(
+                lambda f: collections.deque(jpdb.Vocabulary.iter_parse(f), maxlen=0),
+                export,
+            ),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reviews", type=int, default=1_000_000)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    results = run(args.reviews)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as out:
+            out.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,521 @@
+"""
+Run the benchmark suite and write the results as JSON.
+
+    python -m benchmarks.run --output results.json
+
+Results carry the add-on version from manifest.json so runs of different versions
+can be compared. The review loop, import, scheduler and startup benchmarks need the
+anki package.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+
+from jpdb_anki_import import cache, config, dictionary, jpdb, ratelimit, scraper
+
+from . import memory, stub_server, synthetic
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(fn: Callable, repeat: int = 3) -> dict:
+    """Run fn repeat times and summarize the wall times in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {"min": min(times), "median": statistics.median(times), "runs": repeat}
+
+
+def bench_parse(export: str) -> dict:
+    return {
+        "parse": timed(lambda: jpdb.Vocabulary.parse(export)),
+        "iter_parse": timed(lambda: list(jpdb.Vocabulary.iter_parse(export))),
+    }
+
+
+def _baseline_ratings(reviews: jpdb.ReviewHistory) -> list:
+    """The importer's rating lookup before importer.ratings(): one dict lookup per
+    Review object."""
+    from jpdb_anki_import import importer
+
+    return [importer.JPDB_TO_CARD_ANSWER[review.grade] for review in reviews]
+
+
+def _baseline_template_cards(conf: config.Config, note) -> tuple:
+    """JPDBImporter.backfill's card resolution before template_ords(): each card's
+    template fetched and its name compared."""
+    jp_en_card = None
+    en_jp_card = None
+    for card in note.cards():
+        template_name = card.template()["name"]
+        if template_name == conf.jp2en_card_name:
+            jp_en_card = card
+        elif template_name == conf.en2jp_card_name:
+            en_jp_card = card
+    return jp_en_card, en_jp_card
+
+
+def _template_cards(imp, note) -> tuple:
+    """The same resolution as JPDBImporter.backfill does it now."""
+    jp_en_ord, en_jp_ord = imp.template_ords(note)
+    by_ord = {card.ord: card for card in note.cards()}
+    return by_ord.get(jp_en_ord), by_ord.get(en_jp_ord)
+
+
+def _baseline_card_state_current_next(col, card, rating: int) -> tuple:
+    """JPDBImporter.card_state_current_next before it indexed the states by rating."""
+    from anki.scheduler.v3 import CardAnswer
+
+    if hasattr(col.backend, "get_scheduling_states"):
+        states = col.backend.get_scheduling_states(card.id)
+    else:
+        states = col.backend.get_next_card_states(card.id)
+    if rating == CardAnswer.AGAIN:
+        new_state = states.again
+    elif rating == CardAnswer.HARD:
+        new_state = states.hard
+    elif rating == CardAnswer.GOOD:
+        new_state = states.good
+    elif rating == CardAnswer.EASY:
+        new_state = states.easy
+    else:
+        raise Exception("invalid rating")
+    return states.current, new_state
+
+
+def bench_review_loop(export: str, words: int = 500) -> dict:
+    """The importer's per-review and per-note dispatch against the code it replaced:
+    JPDBImporter.ratings over every review of the export, and template_ords and
+    card_state_current_next on the notes of its first ``words`` words."""
+    from anki.collection import Collection
+
+    from jpdb_anki_import import importer
+
+    vocabulary = list(jpdb.Vocabulary.iter_parse(export))
+    histories = [
+        history
+        for vocab in vocabulary
+        for history in (vocab.jp_en_reviews, vocab.en_jp_reviews)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        col = Collection(os.path.join(tmp, "collection.anki2"))
+        try:
+            note_type = col.models.by_name("Basic (and reversed card)")
+            conf = config.Config(
+                review_file=export,
+                deck_id=col.decks.id("JPDB"),
+                note_type_id=note_type["id"],
+                jp2en_card_name="Card 1",
+                en2jp_card_name="Card 2",
+            )
+            imp = importer.JPDBImporter(conf, col)
+            notes = [imp.new_note(vocab) for vocab in vocabulary[:words]]
+            imp.add_notes(notes)
+            cards = [card for note in notes for card in note.cards()]
+            ratings = range(4)
+
+            results = {
+                "reviews": sum(map(len, histories)),
+                "notes": len(notes),
+                "ratings": {
+                    "baseline": timed(
+                        lambda: [_baseline_ratings(history) for history in histories]
+                    ),
+                    "current": timed(
+                        lambda: [imp.ratings(history) for history in histories]
+                    ),
+                },
+                "template_ords": {
+                    "baseline": timed(
+                        lambda: [_baseline_template_cards(conf, n) for n in notes]
+                    ),
+                    "current": timed(lambda: [_template_cards(imp, n) for n in notes]),
+                },
+                "card_state_current_next": {
+                    "baseline": timed(
+                        lambda: [
+                            _baseline_card_state_current_next(col, card, rating)
+                            for card in cards
+                            for rating in ratings
+                        ]
+                    ),
+                    "current": timed(
+                        lambda: [
+                            imp.card_state_current_next(card, rating)
+                            for card in cards
+                            for rating in ratings
+                        ]
+                    ),
+                },
+            }
+        finally:
+            col.close()
+    for name in ("ratings", "template_ords", "card_state_current_next"):
+        result = results[name]
+        result["speedup"] = result["baseline"]["min"] / result["current"]["min"]
+    return results
+
+
+def bench_transitions(export: str) -> dict:
+    """Replay every history through the offline scheduler with and without its
+    transition memo."""
+    from jpdb_anki_import import importer, scheduling
+
+    table = jpdb.grade_table(importer.JPDB_TO_CARD_ANSWER, importer.NO_RATING)
+    histories = [
+        list(zip(history.timestamps, history.grades.translate(table)))
+        for vocab in jpdb.Vocabulary.iter_parse(export)
+        for history in (vocab.jp_en_reviews, vocab.en_jp_reviews)
+        if len(history)
+    ]
+
+    class Unmemoized(scheduling.Scheduler):
+        next_state = scheduling.Scheduler._next_state
+
+    def replay_all(scheduler):
+        for history in histories:
+            scheduling.replay(scheduler, scheduling.CardState(), history, 0)
+
+    params = scheduling.SchedulerParams()
+    results = {
+        "unmemoized": timed(lambda: replay_all(Unmemoized(params)), repeat=1),
+        "memoized": timed(lambda: replay_all(scheduling.Scheduler(params)), repeat=1),
+    }
+    scheduler = scheduling.Scheduler(params)
+    replay_all(scheduler)
+    results.update(scheduler.stats())
+    results["speedup"] = results["unmemoized"]["min"] / results["memoized"]["min"]
+    return results
+
+
+def bench_lookup_parsing(pages: int = 200) -> dict:
+    """CPU time of parsing only the sections parse_word reads, against parsing
+    the whole page."""
+    page = stub_server.vocabulary_page("言葉", "ことば")
+    jpdb_scraper = scraper.JPDBScraper("")
+    results = {}
+    for name, strain in (("strained", True), ("full_document", False)):
+        start = time.process_time()
+        for _ in range(pages):
+            jpdb_scraper.parse_word(page, strain)
+        cpu_seconds = time.process_time() - start
+        results[name] = {
+            "cpu_seconds": cpu_seconds,
+            "pages_per_second": pages / cpu_seconds,
+        }
+    results["speedup"] = (
+        results["full_document"]["cpu_seconds"] / results["strained"]["cpu_seconds"]
+    )
+    return results
+
+
+def _scrape(
+    vocabulary: list, latency: float, concurrency: int, rate_limiter=None
+) -> dict:
+    with stub_server.StubServer(latency) as server:
+        jpdb_scraper = scraper.JPDBScraper(
+            "", base_url=server.url, rate_limiter=rate_limiter
+        )
+        start = time.perf_counter()
+        for _ in jpdb_scraper.lookup_words(vocabulary, concurrency):
+            pass
+        elapsed = time.perf_counter() - start
+        jpdb_scraper.close()
+    return {
+        "seconds": elapsed,
+        "words_per_second": len(vocabulary) / elapsed,
+        **jpdb_scraper.stats(),
+    }
+
+
+def bench_scraping(words: int = 200, latency: float = 0.02) -> dict:
+    vocabulary = [
+        jpdb.Vocabulary(vid=vid, spelling=f"語{vid}", reading=f"ご{vid}")
+        for vid in range(words)
+    ]
+    results = {"words": words, "latency": latency}
+    for concurrency in (1, 4, 16):
+        # Pace-free, to measure the fetch and parse pipeline itself
+        unlimited = ratelimit.RateLimiter(rate=1e6, burst=concurrency)
+        results[f"concurrency_{concurrency}"] = _scrape(
+            vocabulary, latency, concurrency, unlimited
+        )
+    results["default_rate_limit"] = _scrape(
+        vocabulary, latency, scraper.DEFAULT_CONCURRENCY
+    )
+    return results
+
+
+# Modules whose import time bench_import_time measures
+IMPORT_TIME_MODULES = (
+    "jpdb_anki_import",
+    "jpdb_anki_import.scraper",
+    "jpdb_anki_import.importer",
+)
+
+
+def bench_lookup_backends(words: int = 200, latency: float = 0.02) -> dict:
+    """Look the same words up by scraping their pages and through the API."""
+    vocabulary = [
+        jpdb.Vocabulary(vid=vid, spelling=f"語{vid}", reading=f"ご{vid}", sid=vid)
+        for vid in range(words)
+    ]
+    results = {"words": words, "latency": latency}
+    for backend, api_key in (("html", ""), ("api", "key")):
+        with stub_server.StubServer(latency) as server:
+            jpdb_scraper = scraper.JPDBScraper(
+                "",
+                base_url=server.url,
+                rate_limiter=ratelimit.RateLimiter(rate=1e6, burst=4),
+                api_key=api_key,
+            )
+            start = time.perf_counter()
+            for _ in jpdb_scraper.lookup_words(vocabulary, 4):
+                pass
+            elapsed = time.perf_counter() - start
+            jpdb_scraper.close()
+        results[backend] = {
+            "seconds": elapsed,
+            "words_per_second": words / elapsed,
+            "http_requests": jpdb_scraper.stats()["http_requests"],
+        }
+    return results
+
+
+def bench_dictionary(words: int = 10_000, lookups: int = 10_000) -> dict:
+    """Build the index of a synthetic JMdict file, then time single lookups and
+    lookups through the scraper's dictionary backend."""
+    vocabulary = [
+        jpdb.Vocabulary(vid=vid, spelling=f"語{vid}", reading=f"ご{vid}")
+        for vid in range(1, lookups + 1)
+    ]
+    results = {"words": words}
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "JMdict_e.xml")
+        index_path = os.path.join(tmp, "dictionary.sqlite3")
+        synthetic.generate_jmdict(source, words)
+        start = time.perf_counter()
+        dictionary.build_index(source, index_path)
+        results["build_seconds"] = time.perf_counter() - start
+        results["index_bytes"] = os.path.getsize(index_path)
+
+        local_dictionary = dictionary.Dictionary(source, index_path)
+        lookup = timed(
+            lambda: [
+                local_dictionary.lookup(word.spelling, word.reading)
+                for word in vocabulary
+            ]
+        )
+        results["lookup_microseconds"] = lookup["min"] / lookups * 1e6
+
+        jpdb_scraper = scraper.JPDBScraper("", local_dictionary=local_dictionary)
+        start = time.perf_counter()
+        for _ in jpdb_scraper.lookup_words(vocabulary, 4):
+            pass
+        elapsed = time.perf_counter() - start
+        results["backend_words_per_second"] = lookups / elapsed
+        results.update(jpdb_scraper.stats())
+        jpdb_scraper.close()
+    return results
+
+
+def bench_refresh(words: int = 200, latency: float = 0.02) -> dict:
+    """Scrape words into an empty cache, then refresh them all with conditional
+    requests, as refresh_scraped_fields does for already imported notes."""
+    vocabulary = [
+        jpdb.Vocabulary(vid=vid, spelling=f"語{vid}", reading=f"ご{vid}")
+        for vid in range(words)
+    ]
+    results = {"words": words}
+    with tempfile.TemporaryDirectory() as tmp, stub_server.StubServer(
+        latency
+    ) as server:
+        cache_path = os.path.join(tmp, "cache.sqlite3")
+        for run, revalidate in (("initial", False), ("refresh", True)):
+            jpdb_scraper = scraper.JPDBScraper(
+                "",
+                cache.ScrapeCache(cache_path),
+                base_url=server.url,
+                rate_limiter=ratelimit.RateLimiter(rate=1e6, burst=16),
+                revalidate=revalidate,
+            )
+            start = time.perf_counter()
+            for _ in jpdb_scraper.lookup_words(vocabulary, 16):
+                pass
+            jpdb_scraper.close()
+            stats = jpdb_scraper.stats()
+            results[run] = {
+                "seconds": time.perf_counter() - start,
+                "http_bytes_received": stats["http_bytes_received"],
+                "http_not_modified": stats["http_not_modified"],
+            }
+    return results
+
+
+# Times loading the add-on like Anki does at startup, in a fresh interpreter with
+# aqt stubbed. Anki has loaded anki.collection before it loads add-ons. {imports}
+# is run after the package, e.g. to load what the menu used to import up front.
+STARTUP_SCRIPT = """
+import json, sys, time
+from benchmarks import aqt_stub
+aqt_stub.install()
+import anki.collection
+start = time.perf_counter()
+import jpdb_anki_import
+{imports}
+seconds = time.perf_counter() - start
+assert "jpdb_anki_import.menu" in sys.modules, "the menu action wasn't registered"
+print(json.dumps({{
+    "seconds": seconds,
+    "loads_importer": "jpdb_anki_import.importer" in sys.modules,
+    "loads_bs4": "bs4" in sys.modules,
+}}))
+"""
+# Modules menu.py imported at load time before they were deferred to first use
+EAGER_MENU_IMPORTS = "from jpdb_anki_import import cache, gui, importer, progress"
+
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+    """Run a fresh interpreter in the repository, raising if it fails."""
+    process = subprocess.run(
+        [sys.executable, *args], cwd=ROOT, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"python {' '.join(args)} failed:\n{process.stderr}")
+    return process
+
+
+def bench_startup(repeat: int = 5) -> dict:
+    """Time loading the add-on at Anki startup, as it is and with the modules the
+    menu defers to first use imported up front."""
+    results = {}
+    for name, imports in (("lazy", ""), ("eager", EAGER_MENU_IMPORTS)):
+        runs = [
+            json.loads(_python("-c", STARTUP_SCRIPT.format(imports=imports)).stdout)
+            for _ in range(repeat)
+        ]
+        results[name] = dict(
+            runs[0], seconds=statistics.median(run["seconds"] for run in runs)
+        )
+    results["speedup"] = results["eager"]["seconds"] / results["lazy"]["seconds"]
+    return results
+
+
+def bench_import_time(modules=IMPORT_TIME_MODULES) -> dict:
+    """Cumulative import time of the add-on's modules in a fresh interpreter, as
+    reported by -X importtime, and whether importing them loads BeautifulSoup."""
+    results = {}
+    for module in modules:
+        process = _python("-X", "importtime", "-c", f"import {module}")
+        imported = {}
+        for line in process.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _self, cumulative, name = line[len("import time:") :].split("|")
+            if cumulative.strip().isdigit():
+                imported[name.strip()] = int(cumulative)
+        results[module] = {
+            "microseconds": imported.get(module),
+            "modules": len(imported),
+            "loads_bs4": "bs4" in imported,
+        }
+    return results
+
+
+def bench_import(export: str, replay_engine: str = "anki") -> dict:
+    from anki.collection import Collection
+
+    from jpdb_anki_import import importer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        col = Collection(os.path.join(tmp, "collection.anki2"))
+        try:
+            note_type = col.models.by_name("Basic (and reversed card)")
+            conf = config.Config(
+                review_file=export,
+                deck_id=col.decks.id("JPDB"),
+                note_type_id=note_type["id"],
+                jp2en_card_name="Card 1",
+                en2jp_card_name="Card 2",
+                replay_engine=replay_engine,
+            )
+            start = time.perf_counter()
+            stats = importer.JPDBImporter(conf, col).run()
+            stats["seconds"] = time.perf_counter() - start
+            stats["reviews"] = col.db.scalar("select count() from revlog")
+            stats["reviews_per_second"] = stats["reviews"] / stats["seconds"]
+            return stats
+        finally:
+            col.close()
+
+
+def version() -> str:
+    with open(os.path.join(ROOT, "manifest.json")) as manifest:
+        return json.load(manifest)["version"]
+
+
+def run(
+    vocabulary: int, reviews_per_card: float, import_vocabulary: int, latency: float
+) -> dict:
+    results = {
+        "version": version(),
+        "python": platform.python_version(),
+        "timestamp": int(time.time()),
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        export = os.path.join(tmp, "export.json")
+        results["export_reviews"] = synthetic.generate_export(
+            export, vocabulary, reviews_per_card
+        )
+        results["vocabulary_parse"] = bench_parse(export)
+        results["review_loop"] = bench_review_loop(export)
+        results["transitions"] = bench_transitions(export)
+
+        small_export = os.path.join(tmp, "small_export.json")
+        synthetic.generate_export(small_export, import_vocabulary, reviews_per_card)
+        results["import"] = {
+            engine: bench_import(small_export, engine) for engine in ("anki", "offline")
+        }
+
+    results["import_time"] = bench_import_time()
+    results["startup"] = bench_startup()
+    results["lookup_parsing"] = bench_lookup_parsing()
+    results["scraping"] = bench_scraping(latency=latency)
+    results["refresh"] = bench_refresh(latency=latency)
+    results["lookup_backends"] = bench_lookup_backends(latency=latency)
+    results["dictionary"] = bench_dictionary()
+    results["memory"] = memory.run(vocabulary * reviews_per_card * 1.5)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vocabulary", type=int, default=10_000)
+    parser.add_argument("--reviews-per-card", type=float, default=10.0)
+    parser.add_argument("--import-vocabulary", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run(
+        args.vocabulary, args.reviews_per_card, args.import_vocabulary, args.latency
+    )
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as out:
+            out.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
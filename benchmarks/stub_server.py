@@ -0,0 +1,150 @@
+"""
+Local HTTP server that stands in for jpdb.io in benchmarks.
+"""
+
+import gzip
+import hashlib
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+from typing import List, Optional, Tuple
+
+VOCABULARY_PAGE = """<!DOCTYPE html>
+<html><head><title>{spelling} - JPDB</title></head>
+<body>
+<div class="nav"><a href="/">Home</a><a href="/learn">Learn</a><a href="/settings">Settings</a></div>
+{padding}
+<div class="vbox"><div class="subsection-meanings">
+<div class="part-of-speech"><div>Noun</div><div>Suru verb</div></div>
+<div class="description">1. word; <b>term</b>; expression</div>
+<div class="description">2. speech; language</div>
+<div class="custom-meaning"> my <i>note</i> for {spelling} </div>
+</div></div>
+<div class="card-sentence"><ruby>{spelling}<rt>{reading}</rt></ruby>が好きです。</div>
+{padding}
+</body></html>
+"""
+# Filler standing in for the parts of a real page the scraper doesn't read
+PADDING = '<div class="used-in"><a href="/x">example</a> <span>text</span></div>\n' * 200
+
+
+# Recorded lookup-vocabulary entry for scraper.API_FIELDS, minus the vid
+API_PART_OF_SPEECH = ["n", "vs"]
+API_MEANINGS = [["word", "term", "expression"], ["speech", "language"]]
+
+
+def vocabulary_page(spelling: str, reading: str) -> bytes:
+    return VOCABULARY_PAGE.format(
+        spelling=spelling, reading=reading, padding=PADDING
+    ).encode("utf-8")
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(self.server.latency)
+        if self._throttled():
+            return
+        parts = urllib.parse.urlsplit(self.path).path.split("/")
+        if len(parts) < 5 or parts[1] != "vocabulary":
+            self.send_error(404)
+            return
+        body = vocabulary_page(
+            urllib.parse.unquote(parts[3]), urllib.parse.unquote(parts[4])
+        )
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("if-none-match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("ETag", etag)
+        if "gzip" in self.headers.get("accept-encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        request = self.rfile.read(int(self.headers.get("content-length", 0)))
+        if self._throttled():
+            return
+        if urllib.parse.urlsplit(self.path).path != "/api/v1/lookup-vocabulary":
+            self.send_error(404)
+            return
+        if not self.headers.get("authorization", "").startswith("Bearer "):
+            self.send_error(403)
+            return
+
+        info = [
+            [vid, API_PART_OF_SPEECH, API_MEANINGS]
+            for vid, _sid in json.loads(request)["list"]
+        ]
+        body = json.dumps({"vocabulary_info": info}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _throttled(self) -> bool:
+        """Count the request, and answer it if the server was told to throttle it."""
+        throttle = self.server.next_request()
+        if throttle is None:
+            return False
+        status, retry_after = throttle
+        self.send_response(status)
+        self.send_header("Retry-After", retry_after)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    """Serve canned vocabulary pages, waiting ``latency`` seconds per request.
+
+    Use as a context manager; ``url`` is the base URL to give the scraper. The
+    (status, Retry-After) pairs in ``throttle`` answer the next requests, one each.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency: float = 0.0, handler=StubHandler):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.latency = latency
+        self.requests = 0
+        self.throttle: List[Tuple[int, str]] = []
+        # time.monotonic() of the arrival of each request
+        self.request_times: List[float] = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    def next_request(self) -> Optional[Tuple[int, str]]:
+        with self._lock:
+            self.requests += 1
+            self.request_times.append(time.monotonic())
+            return self.throttle.pop(0) if self.throttle else None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
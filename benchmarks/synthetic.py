@@ -0,0 +1,111 @@
+"""
+Generate synthetic JPDB vocabulary review exports.
+"""
+
+import argparse
+import json
+import random
+
+GRADES = ["okay", "known", "unknown", "hard", "fail", "nothing", "easy", "pass"]
+# Weighted like a typical history: mostly passes, some failures
+GRADE_WEIGHTS = [40, 10, 3, 5, 8, 2, 2, 30]
+START_TIMESTAMP = 1_600_000_000
+
+
+def _card(rng: random.Random, vid: int, reviews: int) -> dict:
+    timestamp = START_TIMESTAMP + rng.randrange(86400 * 30)
+    history = []
+    for _ in range(reviews):
+        timestamp += rng.randrange(600, 86400 * 20)
+        history.append(
+            {
+                "timestamp": timestamp,
+                "grade": rng.choices(GRADES, GRADE_WEIGHTS)[0],
+                "from_anki": False,
+            }
+        )
+    return {
+        "vid": vid,
+        "spelling": f"語{vid}",
+        "reading": f"ご{vid}",
+        "reviews": history,
+    }
+
+
+def generate_export(
+    path: str,
+    vocabulary: int = 10_000,
+    reviews_per_card: float = 10.0,
+    en_jp_fraction: float = 0.5,
+    seed: int = 0,
+) -> int:
+    """Write an export with the given number of words to path.
+
+    Every word gets a JP->EN card and ``en_jp_fraction`` of them an EN->JP card
+    too. Review counts are drawn around ``reviews_per_card``. The file is written
+    card by card, so exports larger than memory can be produced. Returns the total
+    number of reviews written.
+    """
+    rng = random.Random(seed)
+    total = 0
+    with open(path, "w", encoding="utf-8") as out:
+        out.write("{")
+        for i, (key, fraction) in enumerate(
+            [("cards_vocabulary_jp_en", 1.0), ("cards_vocabulary_en_jp", en_jp_fraction)]
+        ):
+            if i:
+                out.write(",")
+            out.write(f'"{key}":[')
+            first = True
+            for vid in range(1, vocabulary + 1):
+                if rng.random() >= fraction:
+                    continue
+                reviews = max(1, round(rng.expovariate(1 / reviews_per_card)))
+                total += reviews
+                if not first:
+                    out.write(",")
+                first = False
+                out.write(json.dumps(_card(rng, vid, reviews), ensure_ascii=False))
+            out.write("]")
+        out.write(',"cards_kanji_keyword_char":[],"cards_kanji_char_keyword":[]}')
+    return total
+
+
+def generate_jmdict(path: str, vocabulary: int = 10_000) -> None:
+    """Write a JMdict file with an entry for each word of generate_export."""
+    with open(path, "w", encoding="utf-8") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        out.write("<!DOCTYPE JMdict [\n")
+        out.write('<!ENTITY n "noun (common) (futsuumeishi)">\n]>\n')
+        out.write("<JMdict>\n")
+        for vid in range(1, vocabulary + 1):
+            out.write(
+                f"<entry><ent_seq>{vid}</ent_seq>"
+                f"<k_ele><keb>語{vid}</keb></k_ele><r_ele><reb>ご{vid}</reb></r_ele>"
+                f"<sense><pos>&n;</pos><gloss>word {vid}</gloss>"
+                f"<gloss>term {vid}</gloss></sense>"
+                f"<sense><gloss>expression {vid}</gloss></sense></entry>\n"
+            )
+        out.write("</JMdict>\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("output")
+    parser.add_argument("--vocabulary", type=int, default=10_000)
+    parser.add_argument("--reviews-per-card", type=float, default=10.0)
+    parser.add_argument("--en-jp-fraction", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    total = generate_export(
+        args.output,
+        args.vocabulary,
+        args.reviews_per_card,
+        args.en_jp_fraction,
+        args.seed,
+    )
+    print(f"wrote {total} reviews to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Compare the card states left by the offline replay with those of the Anki replay.
+
+    python -m benchmarks.validate_replay --vocabulary 300
+
+A synthetic export is imported into two fresh collections, once per replay engine,
+and the resulting cards are matched by vid and card template. Card type, queue,
+repetitions, lapses, ease factor and the (answer, kind, ease factor) of every
+review log row must agree exactly. The Anki replay fuzzes intervals, so instead
+each logged interval of either engine must fall within the range the fuzz allows
+for that answer (see scheduling.Scheduler.interval_range). Review cards must be
+due on the same day relative to their interval, and learning cards within the
+learning fuzz of each other.
+
+Both engines count every review as answered on time. An offline import with
+replay_actual_gaps counts the days between the historical reviews instead, and
+isn't expected to agree on intervals; it isn't compared here.
+
+    python -m benchmarks.validate_replay --vocabulary 300 --workers 4
+
+With --workers, a serial import is instead compared with a sharded one (see
+jpdb_anki_import.sharding) using the same replay engine.
+
+Exits with status 1 if any card disagrees on an exact field, interval or due date.
+"""
+
+import argparse
+import dataclasses
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+from jpdb_anki_import import config, importer, scheduling
+
+from . import synthetic
+
+EXACT_FIELDS = ("type", "queue", "reps", "lapses", "factor", "revlog")
+# The backend delays learning steps by up to this much
+LEARNING_FUZZ_SECS = 300
+
+
+def interval_errors(
+    scheduler: scheduling.Scheduler,
+    revlog: List[Tuple[int, int, int]],
+    intervals: List[int],
+) -> List[dict]:
+    """The review log intervals of a card that fall outside the range the backend's
+    fuzz allows for the answer.
+
+    The card's state follows its own logged intervals, so that the fuzz of earlier
+    answers doesn't add up. Like the backend replay, reviews count as on time.
+    """
+    errors = []
+    state = scheduling.CardState()
+    for index, ((ease, _, _), interval) in enumerate(zip(revlog, intervals)):
+        rating = ease - 1
+        lowest, highest = scheduler.interval_range(
+            state, rating, state.scheduled_days
+        )
+        if not lowest <= interval <= highest:
+            errors.append(
+                {"review": index, "ivl": interval, "range": [lowest, highest]}
+            )
+        state = scheduler.next_state(state, rating, state.scheduled_days)
+        if state.kind == "review":
+            state = dataclasses.replace(state, scheduled_days=interval)
+    return errors
+
+
+def import_export(
+    path: str, export: str, replay_engine: str, workers: int = 1
+) -> Tuple[dict, dict]:
+    """Import the export into a new collection at path, sharded if workers > 1.
+
+    Returns the import stats and the cards by (vid, template ordinal).
+    """
+    from anki.collection import Collection
+
+    col = Collection(path)
+    try:
+        note_type = col.models.by_name("Basic (and reversed card)")
+        conf = config.Config(
+            review_file=export,
+            deck_id=col.decks.id("JPDB"),
+            note_type_id=note_type["id"],
+            jp2en_card_name="Card 1",
+            en2jp_card_name="Card 2",
+            replay_engine=replay_engine,
+        )
+        start = time.perf_counter()
+        if workers > 1:
+            from jpdb_anki_import import sharding
+
+            stats = sharding.import_sharded(conf, col, workers)
+        else:
+            stats = importer.JPDBImporter(conf, col).run()
+        stats["seconds"] = time.perf_counter() - start
+
+        revlog: Dict[int, List[Tuple[int, int, int]]] = {}
+        intervals: Dict[int, List[int]] = {}
+        rows = col.db.all(
+            "select cid, ease, type, factor, ivl from revlog order by id"
+        )
+        for card_id, ease, review_kind, factor, interval in rows:
+            revlog.setdefault(card_id, []).append((ease, review_kind, factor))
+            intervals.setdefault(card_id, []).append(interval)
+        scheduler = scheduling.Scheduler(
+            scheduling.SchedulerParams.from_deck_config(
+                col.decks.config_dict_for_deck_id(conf.deck_id)
+            )
+        )
+
+        imported_notes = importer.JPDBImporter(conf, col).imported_notes()
+        vids = {note_id: vid for vid, note_id in imported_notes.items()}
+        cards = {}
+        rows = col.db.all(
+            "select id, nid, ord, type, queue, due, reps, lapses, ivl, factor"
+            " from cards"
+        )
+        for row in rows:
+            cid, nid, template, card_type, queue, due, reps, lapses, ivl, factor = row
+            if nid not in vids:
+                continue
+            cards[(vids[nid], template)] = {
+                "type": card_type,
+                "queue": queue,
+                "reps": reps,
+                "lapses": lapses,
+                "revlog": revlog.get(cid, []),
+                "ivl": ivl,
+                "due": due,
+                "factor": factor,
+                "interval_errors": interval_errors(
+                    scheduler, revlog.get(cid, []), intervals.get(cid, [])
+                ),
+            }
+        return stats, cards
+    finally:
+        col.close()
+
+
+def due_matches(expected: dict, actual: dict, slack_secs: float) -> bool:
+    """Whether two cards are due on the same day, or for learning cards, at times no
+    further apart than the learning fuzz and slack_secs."""
+    if expected["queue"] != actual["queue"]:
+        return False
+    if expected["queue"] == scheduling.QUEUE_TYPE_REV:
+        # Both are scheduled from the day of their import
+        return expected["due"] - expected["ivl"] == actual["due"] - actual["ivl"]
+    if expected["queue"] == scheduling.QUEUE_TYPE_LRN:
+        difference = abs(expected["due"] - actual["due"])
+        return difference <= LEARNING_FUZZ_SECS + slack_secs
+    return expected["due"] == actual["due"]
+
+
+def compare(
+    expected: dict,
+    actual: dict,
+    labels: Tuple[str, str] = ("anki", "offline"),
+    slack_secs: float = 0.0,
+) -> dict:
+    """Summarize how the cards of actual differ from those of expected.
+
+    slack_secs is how far apart the two imports answered the same review.
+    """
+    mismatches = {field: 0 for field in EXACT_FIELDS + ("interval", "due")}
+    examples = []
+    interval_ratios = []
+    factor_differences = []
+    for key, card in expected.items():
+        other = actual.get(key)
+        if other is None:
+            mismatches["missing"] = mismatches.get("missing", 0) + 1
+            continue
+        differing = [field for field in EXACT_FIELDS if card[field] != other[field]]
+        if card["interval_errors"] or other["interval_errors"]:
+            differing.append("interval")
+        if not due_matches(card, other, slack_secs):
+            differing.append("due")
+        for field in differing:
+            mismatches[field] += 1
+        if differing and len(examples) < 10:
+            examples.append({"card": list(key), labels[0]: card, labels[1]: other})
+        if card["ivl"] > 0:
+            interval_ratios.append(other["ivl"] / card["ivl"])
+        factor_differences.append(abs(other["factor"] - card["factor"]))
+
+    interval_ratios.sort()
+    return {
+        "cards": len(expected),
+        "mismatches": mismatches,
+        "interval_ratio_median": statistics.median(interval_ratios)
+        if interval_ratios
+        else None,
+        "interval_ratio_range": [interval_ratios[0], interval_ratios[-1]]
+        if interval_ratios
+        else None,
+        "max_factor_difference": max(factor_differences, default=0),
+        "examples": examples,
+    }
+
+
+def validate(vocabulary: int, reviews_per_card: float, seed: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        export = os.path.join(tmp, "export.json")
+        synthetic.generate_export(export, vocabulary, reviews_per_card, seed=seed)
+        anki_stats, anki_cards = import_export(
+            os.path.join(tmp, "anki.anki2"), export, "anki"
+        )
+        offline_stats, offline_cards = import_export(
+            os.path.join(tmp, "offline.anki2"), export, "offline"
+        )
+
+    slack = anki_stats["seconds"] + offline_stats["seconds"]
+    result = compare(anki_cards, offline_cards, slack_secs=slack)
+    result["anki_seconds"] = anki_stats["seconds"]
+    result["offline_seconds"] = offline_stats["seconds"]
+    result["speedup"] = anki_stats["seconds"] / offline_stats["seconds"]
+    return result
+
+
+def validate_sharded(
+    vocabulary: int, reviews_per_card: float, seed: int, workers: int, engine: str
+) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        export = os.path.join(tmp, "export.json")
+        synthetic.generate_export(export, vocabulary, reviews_per_card, seed=seed)
+        serial_stats, serial_cards = import_export(
+            os.path.join(tmp, "serial.anki2"), export, engine
+        )
+        sharded_stats, sharded_cards = import_export(
+            os.path.join(tmp, "sharded.anki2"), export, engine, workers
+        )
+
+    slack = serial_stats["seconds"] + sharded_stats["seconds"]
+    result = compare(serial_cards, sharded_cards, ("serial", "sharded"), slack)
+    result["serial_seconds"] = serial_stats["seconds"]
+    result["sharded_seconds"] = sharded_stats["seconds"]
+    result["speedup"] = serial_stats["seconds"] / sharded_stats["seconds"]
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vocabulary", type=int, default=300)
+    parser.add_argument("--reviews-per-card", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workers", type=int, default=1, help="compare a sharded import instead"
+    )
+    parser.add_argument(
+        "--replay-engine", choices=("anki", "offline"), default="offline"
+    )
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        result = validate_sharded(
+            args.vocabulary,
+            args.reviews_per_card,
+            args.seed,
+            args.workers,
+            args.replay_engine,
+        )
+    else:
+        result = validate(args.vocabulary, args.reviews_per_card, args.seed)
+    print(json.dumps(result, indent=2))
+    if any(result["mismatches"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -38,6 +38,9 @@ with zipfile.ZipFile(addon_name, "w") as addon_zip:
         # Skip tests
         if "tests" in root_dirs:
             continue
+        # Skip local data such as the scrape cache
+        if "user_files" in root_dirs:
+            continue
 
         for file in files:
             # Skip compiled files
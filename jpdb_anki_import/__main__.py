@@ -0,0 +1,182 @@
+"""
+Import a JPDB review export into an Anki collection file without the GUI.
+
+    python -m jpdb_anki_import collection.anki2 --review-file review.json --deck JPDB
+
+Every config.Config field can be given as a flag (e.g. --scrape-concurrency 8) or
+in a JSON file passed with --config; flags take precedence. Anki must not have the
+collection open at the same time.
+"""
+
+import argparse
+import contextlib
+import dataclasses
+import json
+import pathlib
+import sqlite3
+import sys
+from typing import List, Optional
+
+from anki.collection import Collection
+
+from . import compression, config, duplicates, importer, jpdb, progress
+
+# Config fields that only take one of a few values
+CHOICES = {
+    "duplicate_policy": duplicates.POLICIES,
+    "replay_engine": config.REPLAY_ENGINES,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m jpdb_anki_import",
+        description="Import JPDB vocabulary and review history into an Anki collection.",
+    )
+    parser.add_argument("collection", help="path to the .anki2 collection file")
+    parser.add_argument("--config", help="JSON file with config.Config fields")
+    parser.add_argument("--deck", help="name of the deck to import into")
+    parser.add_argument("--note-type", help="name of the note type to create")
+    parser.add_argument(
+        "--scrape-field",
+        action="append",
+        default=[],
+        metavar="ROLE=FIELD",
+        help="fill an Anki field with a scraped JPDB field (glossary, notes, sentence)",
+    )
+    parser.add_argument(
+        "--quiet", action="store_true", help="don't print progress to stderr"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="import new words on this many processes (needs Anki 23.10 or newer)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="only report how many reviews the (lossy) review compression options "
+        "would drop, without importing anything",
+    )
+
+    options = parser.add_argument_group("import options")
+    for field in dataclasses.fields(config.Config):
+        flag = "--" + field.name.replace("_", "-")
+        if field.type is bool:
+            options.add_argument(flag, action=argparse.BooleanOptionalAction)
+        elif field.type in (int, float, str):
+            options.add_argument(
+                flag, type=field.type, choices=CHOICES.get(field.name)
+            )
+    return parser
+
+
+def config_values(args: argparse.Namespace) -> dict:
+    """config.Config fields from the --config file and the flags."""
+    values = {}
+    if args.config:
+        with open(args.config, encoding="utf-8") as config_file:
+            values.update(json.load(config_file))
+    for field in dataclasses.fields(config.Config):
+        value = getattr(args, field.name, None)
+        if value is not None:
+            values[field.name] = value
+
+    mapping = dict(values.get("scraped_jpdb_field_mapping", {}))
+    for scrape_field in args.scrape_field:
+        role, _, field_name = scrape_field.partition("=")
+        mapping[role] = field_name
+    values["scraped_jpdb_field_mapping"] = mapping
+
+    # The flags are checked by argparse, but not the --config file.
+    for name, choices in CHOICES.items():
+        if name in values and values[name] not in choices:
+            raise SystemExit(
+                f"{name} must be one of {', '.join(choices)}, not {values[name]!r}"
+            )
+    return values
+
+
+def load_config(args: argparse.Namespace, col: Collection) -> config.Config:
+    conf = config.Config(**config_values(args))
+    if args.deck:
+        conf.deck_id = col.decks.id(args.deck)
+    elif not conf.deck_id:
+        conf.deck_id = col.decks.get_current_id()
+    if args.note_type:
+        note_type_id = col.models.id_for_name(args.note_type)
+        if note_type_id is None:
+            raise SystemExit(f"no note type named {args.note_type!r}")
+        conf.note_type_id = note_type_id
+    elif not conf.note_type_id:
+        conf.note_type_id = col.models.current()["id"]
+    return conf
+
+
+def day_offset(collection_path: str) -> int:
+    """The collection's crt, where its days start, read without opening it in Anki.
+
+    Returns 0 (UTC days) if the file can't be read.
+    """
+    uri = pathlib.Path(collection_path).resolve().as_uri() + "?mode=ro"
+    try:
+        with contextlib.closing(sqlite3.connect(uri, uri=True)) as db:
+            return db.execute("select crt from col").fetchone()[0]
+    except (sqlite3.Error, TypeError):
+        return 0
+
+
+def dry_run(args: argparse.Namespace) -> int:
+    conf = config.Config(**config_values(args))
+    if not conf.review_file:
+        raise SystemExit("--review-file is required")
+    compressor = compression.ReviewCompressor.from_config(
+        conf, day_offset(args.collection)
+    )
+    report = compressor.report(jpdb.Vocabulary.iter_parse(conf.review_file))
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.dry_run:
+        return dry_run(args)
+
+    col = Collection(args.collection)
+    jpdb_scraper = None
+    try:
+        if not col.v3_scheduler():
+            raise SystemExit("the collection must use the v3 scheduler")
+        conf = load_config(args, col)
+        if not conf.review_file:
+            raise SystemExit("--review-file is required")
+
+        jpdb_scraper = importer.create_scraper(conf)
+        reporter = (
+            progress.ProgressReporter()
+            if args.quiet
+            else progress.ConsoleProgressReporter()
+        )
+        if args.workers > 1:
+            from . import sharding
+
+            stats = sharding.import_sharded(
+                conf, col, args.workers, jpdb_scraper, reporter
+            )
+        else:
+            stats = importer.JPDBImporter(conf, col, jpdb_scraper, reporter).run()
+    finally:
+        if jpdb_scraper is not None:
+            jpdb_scraper.close()
+        col.close()
+
+    json.dump(stats, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
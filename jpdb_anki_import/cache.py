@@ -0,0 +1,179 @@
+"""
+Persistent on-disk cache of scraped JPDB vocabulary pages.
+"""
+
+import dataclasses
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from . import jpdb
+
+# Anki keeps the user_files directory of an add-on across updates.
+USER_FILES_DIR = os.path.join(os.path.dirname(__file__), "user_files")
+DEFAULT_CACHE_PATH = os.path.join(USER_FILES_DIR, "scrape_cache.sqlite3")
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 100_000
+# How many writes happen between two eviction passes
+EVICT_EVERY = 500
+# Columns added to the words table after its first release, with their types
+MIGRATED_COLUMNS = {"etag": "TEXT", "last_modified": "TEXT"}
+
+
+@dataclasses.dataclass
+class Entry:
+    """A cached word with the validators of the page it was scraped from."""
+
+    word: dict
+    etag: Optional[str]
+    last_modified: Optional[str]
+
+
+class ScrapeCache:
+    """Cache of scraped words keyed by (vid, spelling, reading).
+
+    Entries older than ``ttl`` seconds are treated as missing. Expired entries are
+    only deleted if they have no ETag or Last-Modified to revalidate them with, and
+    once the cache holds more than ``max_entries`` rows the oldest ones are evicted.
+    The cache may be shared by the scraper's worker threads.
+    """
+
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+    ):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS words (
+                vid INTEGER NOT NULL,
+                spelling TEXT NOT NULL,
+                reading TEXT NOT NULL,
+                word TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                PRIMARY KEY (vid, spelling, reading)
+            )
+            """
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS words_fetched_at ON words (fetched_at)"
+        )
+        self._migrate()
+        self._db.commit()
+
+    def _migrate(self) -> None:
+        """Add the columns that caches created by older versions lack."""
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(words)")}
+        for column, column_type in MIGRATED_COLUMNS.items():
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE words ADD COLUMN {column} {column_type}")
+
+    def get(self, vocab: jpdb.Vocabulary) -> Optional[dict]:
+        """Return the cached fields of a scraped word, or None on a miss."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT word FROM words "
+                "WHERE vid = ? AND spelling = ? AND reading = ? AND fetched_at >= ?",
+                (vocab.vid, vocab.spelling, vocab.reading, time.time() - self._ttl),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def entry(self, vocab: jpdb.Vocabulary) -> Optional[Entry]:
+        """Return a cached word with its page validators, however old it is.
+
+        Used to revalidate the page with JPDB rather than to skip fetching it, so
+        it doesn't count as a hit or a miss.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT word, etag, last_modified FROM words "
+                "WHERE vid = ? AND spelling = ? AND reading = ?",
+                (vocab.vid, vocab.spelling, vocab.reading),
+            ).fetchone()
+        if row is None:
+            return None
+        return Entry(json.loads(row[0]), row[1], row[2])
+
+    def put(
+        self,
+        vocab: jpdb.Vocabulary,
+        word: dict,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO words "
+                "(vid, spelling, reading, word, fetched_at, etag, last_modified) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    vocab.vid,
+                    vocab.spelling,
+                    vocab.reading,
+                    json.dumps(word, ensure_ascii=False),
+                    time.time(),
+                    etag,
+                    last_modified,
+                ),
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict()
+            self._db.commit()
+
+    def touch(self, vocab: jpdb.Vocabulary) -> None:
+        """Mark a cached word as fresh again, after JPDB confirmed it is unchanged."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE words SET fetched_at = ? "
+                "WHERE vid = ? AND spelling = ? AND reading = ?",
+                (time.time(), vocab.vid, vocab.spelling, vocab.reading),
+            )
+            self._db.commit()
+
+    def _evict(self) -> None:
+        # Expired words that JPDB can confirm as unchanged are kept, see entry().
+        self._db.execute(
+            "DELETE FROM words WHERE fetched_at < ? "
+            "AND etag IS NULL AND last_modified IS NULL",
+            (time.time() - self._ttl,),
+        )
+        (count,) = self._db.execute("SELECT count(*) FROM words").fetchone()
+        if count > self._max_entries:
+            self._db.execute(
+                "DELETE FROM words WHERE rowid IN "
+                "(SELECT rowid FROM words ORDER BY fetched_at LIMIT ?)",
+                (count - self._max_entries,),
+            )
+
+    def stats(self) -> dict:
+        return {"cache_hits": self.hits, "cache_misses": self.misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._evict()
+            self._db.commit()
+            self._db.close()
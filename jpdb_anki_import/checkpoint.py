@@ -0,0 +1,114 @@
+"""
+Journal of the words an import has finished, so that an interrupted import can
+resume where it stopped.
+"""
+
+import json
+import os
+import tempfile
+from typing import Dict, Iterable, Optional, Tuple
+
+JOURNAL_SUFFIX = ".jpdb-import.json"
+# A resumed journal with more batches than this is rewritten as a single line
+COMPACT_BATCHES = 64
+
+
+def journal_path(collection_path: str) -> str:
+    """The journal of imports into a collection is kept next to its file."""
+    return collection_path + JOURNAL_SUFFIX
+
+
+def _line(data: dict) -> str:
+    return json.dumps(data, separators=(",", ":")) + "\n"
+
+
+class Checkpoint:
+    """The vids an import of one review file has completed, and their note ids.
+
+    Words that were skipped map to None. The journal is a file of JSON lines: the
+    first names the review file and may hold completed words, and each record()
+    appends one line with a batch, so saving stays proportional to the batch. A
+    crash can only tear the last line, which load() drops.
+    """
+
+    def __init__(self, path: str, review_file: str):
+        self.path = path
+        self.review_file = os.path.abspath(review_file)
+        self.notes: Dict[int, Optional[int]] = {}
+        # Whether the file at path is this import's journal, and can be appended to
+        self._started = False
+
+    @classmethod
+    def load(cls, path: str, review_file: str) -> "Checkpoint":
+        """Read the journal at path, if it belongs to an import of review_file."""
+        checkpoint = cls(path, review_file)
+        try:
+            with open(path, encoding="utf-8") as journal:
+                lines = journal.readlines()
+        except OSError:
+            return checkpoint
+        batches = []
+        for line in lines:
+            # Without its newline, the line may be glued to the next one appended.
+            if not line.endswith("\n"):
+                break
+            try:
+                batches.append(json.loads(line))
+            except ValueError:
+                break
+        if not batches or batches[0].get("review_file") != checkpoint.review_file:
+            return checkpoint
+        for batch in batches:
+            checkpoint.notes.update(zip(batch["vids"], batch["note_ids"]))
+        if len(batches) < len(lines) or len(batches) > COMPACT_BATCHES:
+            checkpoint.compact()
+        else:
+            checkpoint._started = True
+        return checkpoint
+
+    def __contains__(self, vid: int) -> bool:
+        return vid in self.notes
+
+    def __len__(self) -> int:
+        return len(self.notes)
+
+    def record(self, completed: Iterable[Tuple[int, Optional[int]]]) -> None:
+        """Add (vid, note id) pairs and append them to the journal."""
+        batch = dict(completed)
+        self.notes.update(batch)
+        if not self._started:
+            self.compact()
+            return
+        with open(self.path, "a", encoding="utf-8") as journal:
+            data = {"vids": list(batch), "note_ids": list(batch.values())}
+            journal.write(_line(data))
+            journal.flush()
+            os.fsync(journal.fileno())
+
+    def compact(self) -> None:
+        """Replace the journal atomically with a single line of all the words."""
+        data = {
+            "review_file": self.review_file,
+            "vids": list(self.notes),
+            "note_ids": list(self.notes.values()),
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as journal:
+                journal.write(_line(data))
+                journal.flush()
+                os.fsync(journal.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self._started = True
+
+    def clear(self) -> None:
+        self.notes = {}
+        self._started = False
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
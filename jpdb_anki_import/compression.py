@@ -0,0 +1,140 @@
+"""
+Drop reviews from card histories before they are replayed.
+
+Every review that is dropped saves one pass through the scheduler. Dropping is
+lossy: each answer moves a card through its learning steps however little time
+passed since the last one, so a compressed history can leave the card in another
+state than the full one. All steps are off unless a config enables them.
+"""
+
+from typing import Dict, Iterable, List
+
+from . import config, jpdb
+
+SECONDS_PER_DAY = 86400
+
+# Compression steps, in the order they are applied
+POLICIES = ("duplicate_timestamps", "same_day", "max_reviews")
+
+
+def _select(history: jpdb.ReviewHistory, indices: List[int]) -> jpdb.ReviewHistory:
+    if len(indices) == len(history):
+        return history
+    return jpdb.ReviewHistory(
+        (history.timestamps[i] for i in indices),
+        bytes(history.grades[i] for i in indices),
+    )
+
+
+def drop_duplicate_timestamps(history: jpdb.ReviewHistory) -> jpdb.ReviewHistory:
+    """Keep only the first of several reviews recorded at the same second."""
+    timestamps = history.timestamps
+    indices = [
+        i
+        for i, timestamp in enumerate(timestamps)
+        if i == 0 or timestamp != timestamps[i - 1]
+    ]
+    return _select(history, indices)
+
+
+def collapse_same_day(
+    history: jpdb.ReviewHistory, day_offset: int = 0
+) -> jpdb.ReviewHistory:
+    """Keep only the first and the last review of each day.
+
+    Days start at ``day_offset`` (like scheduling.replay, the collection's crt),
+    so reviews are grouped by the same day boundaries the scheduler counts.
+    """
+    days = [
+        (timestamp - day_offset) // SECONDS_PER_DAY for timestamp in history.timestamps
+    ]
+    last = len(days) - 1
+    return _select(
+        history,
+        [
+            i
+            for i, day in enumerate(days)
+            if i == 0 or i == last or day != days[i - 1] or day != days[i + 1]
+        ],
+    )
+
+
+def cap_reviews(history: jpdb.ReviewHistory, max_reviews: int) -> jpdb.ReviewHistory:
+    """Keep only the most recent max_reviews reviews."""
+    if len(history) <= max_reviews:
+        return history
+    return jpdb.ReviewHistory(
+        history.timestamps[-max_reviews:], history.grades[-max_reviews:]
+    )
+
+
+class ReviewCompressor:
+    """Apply the compression steps enabled in a config.Config to review histories,
+    counting the reviews each step drops."""
+
+    def __init__(
+        self,
+        drop_duplicates: bool = False,
+        collapse_same_day: bool = False,
+        max_reviews: int = 0,
+        day_offset: int = 0,
+    ):
+        self.drop_duplicates = drop_duplicates
+        self.collapse_same_day = collapse_same_day
+        self.max_reviews = max_reviews
+        self.day_offset = day_offset
+        self.reviews = 0
+        self.dropped: Dict[str, int] = dict.fromkeys(POLICIES, 0)
+
+    @classmethod
+    def from_config(
+        cls, conf: config.Config, day_offset: int = 0
+    ) -> "ReviewCompressor":
+        return cls(
+            conf.drop_duplicate_reviews,
+            conf.collapse_same_day_reviews,
+            conf.max_reviews_per_card,
+            day_offset,
+        )
+
+    def compress(self, history: jpdb.ReviewHistory) -> jpdb.ReviewHistory:
+        self.reviews += len(history)
+        if self.drop_duplicates:
+            history = self._apply(
+                "duplicate_timestamps", drop_duplicate_timestamps, history
+            )
+        if self.collapse_same_day:
+            history = self._apply(
+                "same_day", lambda h: collapse_same_day(h, self.day_offset), history
+            )
+        if self.max_reviews > 0:
+            history = self._apply(
+                "max_reviews", lambda h: cap_reviews(h, self.max_reviews), history
+            )
+        return history
+
+    def _apply(self, policy, step, history):
+        before = len(history)
+        history = step(history)
+        self.dropped[policy] += before - len(history)
+        return history
+
+    def stats(self) -> dict:
+        return {"reviews_dropped": dict(self.dropped)}
+
+    def report(self, vocabulary: Iterable[jpdb.Vocabulary]) -> dict:
+        """Compress the vocabulary's histories without importing anything, and
+        report how many scheduler calls each step would save."""
+        cards = 0
+        for vocab in vocabulary:
+            for history in (vocab.en_jp_reviews, vocab.jp_en_reviews):
+                if len(history):
+                    cards += 1
+                    self.compress(history)
+        saved = sum(self.dropped.values())
+        return {
+            "cards": cards,
+            "reviews": self.reviews,
+            "scheduler_calls": self.reviews - saved,
+            "scheduler_calls_saved": dict(self.dropped),
+        }
@@ -0,0 +1,148 @@
+"""
+Keep-alive HTTP connections shared by all lookups of a scraper.
+"""
+
+import dataclasses
+import gzip
+import http.client
+import threading
+import time
+import urllib.parse
+from typing import List, Mapping, Optional
+
+MAX_REDIRECTS = 5
+DEFAULT_TIMEOUT = 30
+
+
+@dataclasses.dataclass
+class Response:
+    status: int
+    headers: http.client.HTTPMessage
+    body: bytes
+    # Seconds between sending the request and reading the full body
+    latency: float
+
+
+class HTTPError(Exception):
+    def __init__(self, response: Response):
+        super().__init__(f"HTTP {response.status}")
+        self.response = response
+
+
+class ConnectionPool:
+    """Pool of persistent connections to a single host.
+
+    Connections are handed out to one request at a time and returned to the pool
+    afterwards, so each worker thread reuses an open TCP/TLS session instead of
+    paying for a new handshake per request. A pooled connection that turns out to
+    have been closed by the server is replaced transparently.
+    """
+
+    def __init__(self, base_url: str, timeout: float = DEFAULT_TIMEOUT):
+        url = urllib.parse.urlsplit(base_url)
+        self._https = url.scheme == "https"
+        self._host = url.hostname
+        self._port = url.port
+        self._timeout = timeout
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.connections_opened = 0
+        self.bytes_received = 0
+        self.latencies: List[float] = []
+
+    def _connect(self) -> http.client.HTTPConnection:
+        with self._lock:
+            self.connections_opened += 1
+        if self._https:
+            return http.client.HTTPSConnection(
+                self._host, self._port, timeout=self._timeout
+            )
+        return http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+
+    def _acquire(self) -> Optional[http.client.HTTPConnection]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop()
+        return None
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            self._idle.append(conn)
+
+    def _send(
+        self, conn: http.client.HTTPConnection, method, path, headers, body
+    ) -> Response:
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=dict(headers))
+            resp = conn.getresponse()
+            body = resp.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            raise
+        latency = time.perf_counter() - start
+
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += len(body)
+            self.latencies.append(latency)
+
+        if resp.headers.get("content-encoding", "").lower() == "gzip":
+            body = gzip.decompress(body)
+        return Response(resp.status, resp.headers, body, latency)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        headers: Mapping[str, str],
+        body: Optional[bytes] = None,
+    ) -> Response:
+        """Send a request, following redirects to the same host."""
+        for _ in range(MAX_REDIRECTS + 1):
+            conn = self._acquire()
+            if conn is None:
+                response = self._send(self._connect(), method, path, headers, body)
+            else:
+                try:
+                    response = self._send(conn, method, path, headers, body)
+                except ConnectionError:
+                    # The server dropped the idle connection; try a fresh one.
+                    response = self._send(
+                        self._connect(), method, path, headers, body
+                    )
+
+            location = response.headers.get("location")
+            if response.status not in (301, 302, 303, 307, 308) or not location:
+                return response
+            url = urllib.parse.urlsplit(urllib.parse.urljoin(path, location))
+            if url.hostname not in (None, self._host):
+                return response
+            path = urllib.parse.urlunsplit(("", "", url.path, url.query, ""))
+            if response.status in (301, 302, 303):
+                # Like browsers, follow these with a GET.
+                method, body = "GET", None
+
+        raise HTTPError(response)
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = list(self.latencies)
+        return {
+            "http_requests": self.requests,
+            "http_connections_opened": self.connections_opened,
+            "http_bytes_received": self.bytes_received,
+            "http_mean_latency": sum(latencies) / len(latencies) if latencies else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
@@ -0,0 +1,219 @@
+"""
+Glossaries from a local JMdict file, for imports that don't look words up on JPDB.
+
+The XML file is converted once into an SQLite index keyed by (spelling, reading),
+which is rebuilt whenever the file changes. Lookups are single primary key reads.
+"""
+
+import gzip
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from . import cache
+
+DEFAULT_INDEX_PATH = os.path.join(cache.USER_FILES_DIR, "dictionary.sqlite3")
+# Bumped whenever the layout of the index changes, to rebuild older indexes
+INDEX_VERSION = "1"
+# xml:lang of glosses that are imported; glosses without one are English
+GLOSS_LANGUAGE = "eng"
+_XML_LANG = "{http://www.w3.org/XML/1998/namespace}lang"
+
+# Part of speech and definitions of a word
+Entry = Tuple[List[str], List[str]]
+
+
+def _source_signature(source: str) -> Dict[str, str]:
+    stat = os.stat(source)
+    return {
+        "version": INDEX_VERSION,
+        "source": os.path.abspath(source),
+        "size": str(stat.st_size),
+        "mtime": str(stat.st_mtime_ns),
+    }
+
+
+def _open_source(source: str):
+    if source.endswith(".gz"):
+        return gzip.open(source, "rb")
+    return open(source, "rb")
+
+
+def _entry_words(entry) -> Iterator[Tuple[Tuple[str, str], Entry]]:
+    """Yield ((spelling, reading), (part of speech, definitions)) for each way of
+    writing a JMdict entry."""
+    kanji = [keb.text for keb in entry.iterfind("k_ele/keb")]
+    readings = []
+    for r_ele in entry.iterfind("r_ele"):
+        reb = r_ele.findtext("reb")
+        if r_ele.find("re_nokanji") is not None or not kanji:
+            readings.append((reb, reb))
+        else:
+            restricted = [restr.text for restr in r_ele.iterfind("re_restr")]
+            readings.extend((keb, reb) for keb in restricted or kanji)
+
+    senses = []
+    part_of_speech: List[str] = []
+    for sense in entry.iterfind("sense"):
+        # A sense without part of speech has the one of the sense before it.
+        part_of_speech = [pos.text for pos in sense.iterfind("pos")] or part_of_speech
+        glosses = [
+            gloss.text
+            for gloss in sense.iterfind("gloss")
+            if gloss.text and gloss.get(_XML_LANG, GLOSS_LANGUAGE) == GLOSS_LANGUAGE
+        ]
+        if glosses:
+            stagk = {stag.text for stag in sense.iterfind("stagk")}
+            stagr = {stag.text for stag in sense.iterfind("stagr")}
+            senses.append((part_of_speech, "; ".join(glosses), stagk, stagr))
+
+    for spelling, reading in readings:
+        pos: List[str] = []
+        definitions = []
+        for sense_pos, definition, stagk, stagr in senses:
+            if (stagk and spelling not in stagk) or (stagr and reading not in stagr):
+                continue
+            pos.extend(p for p in sense_pos if p not in pos)
+            definitions.append(definition)
+        if definitions:
+            yield (spelling, reading), (pos, definitions)
+
+
+def iter_jmdict(source: str) -> Iterator[Tuple[Tuple[str, str], Entry]]:
+    """Stream the words of a JMdict XML file (optionally gzipped)."""
+    # ElementTree is only needed to build an index, which few imports do.
+    from xml.etree import ElementTree
+
+    with _open_source(source) as xml:
+        events = ElementTree.iterparse(xml, events=("start", "end"))
+        _, root = next(events)
+        for event, element in events:
+            if event == "end" and element.tag == "entry":
+                yield from _entry_words(element)
+                # Keep memory flat on the 100+ MB file.
+                root.clear()
+
+
+def build_index(source: str, index_path: str = DEFAULT_INDEX_PATH) -> int:
+    """Write the index of the JMdict file source to index_path, replacing any
+    earlier index atomically. Returns the number of words indexed.
+
+    When several entries share a spelling and reading, the first one is kept, as
+    JMdict lists more common entries first.
+    """
+    directory = os.path.dirname(os.path.abspath(index_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(fd)
+    try:
+        db = sqlite3.connect(temp_path)
+        try:
+            db.execute("PRAGMA journal_mode=OFF")
+            db.execute("PRAGMA synchronous=OFF")
+            db.execute(
+                """
+                CREATE TABLE words (
+                    spelling TEXT NOT NULL,
+                    reading TEXT NOT NULL,
+                    part_of_speech TEXT NOT NULL,
+                    definitions TEXT NOT NULL,
+                    PRIMARY KEY (spelling, reading)
+                ) WITHOUT ROWID
+                """
+            )
+            db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            db.executemany(
+                "INSERT OR IGNORE INTO words VALUES (?, ?, ?, ?)",
+                (
+                    (
+                        spelling,
+                        reading,
+                        json.dumps(pos, ensure_ascii=False),
+                        json.dumps(definitions, ensure_ascii=False),
+                    )
+                    for (spelling, reading), (pos, definitions) in iter_jmdict(source)
+                ),
+            )
+            db.executemany(
+                "INSERT INTO meta VALUES (?, ?)", _source_signature(source).items()
+            )
+            db.commit()
+            (words,) = db.execute("SELECT count(*) FROM words").fetchone()
+        finally:
+            db.close()
+        os.replace(temp_path, index_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return words
+
+
+def index_current(source: str, index_path: str = DEFAULT_INDEX_PATH) -> bool:
+    """Whether index_path holds the index of the current version of source."""
+    if not os.path.exists(index_path):
+        return False
+    try:
+        db = sqlite3.connect(index_path)
+        try:
+            meta = dict(db.execute("SELECT key, value FROM meta"))
+        finally:
+            db.close()
+    except sqlite3.Error:
+        return False
+    return meta == _source_signature(source)
+
+
+class Dictionary:
+    """Part of speech and definitions of words, from the index of a JMdict file.
+
+    The index is opened, and built if the source changed, on the first lookup
+    rather than up front: building it for the full JMdict takes a while, and
+    belongs on the import's background thread. Lookups may come from the
+    scraper's worker threads.
+    """
+
+    def __init__(self, source: str, index_path: str = DEFAULT_INDEX_PATH):
+        self.source = source
+        self.index_path = index_path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.build_seconds = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _open(self) -> sqlite3.Connection:
+        if not index_current(self.source, self.index_path):
+            start = time.perf_counter()
+            build_index(self.source, self.index_path)
+            self.build_seconds = time.perf_counter() - start
+        return sqlite3.connect(self.index_path, check_same_thread=False)
+
+    def lookup(self, spelling: str, reading: str) -> Optional[Entry]:
+        with self._lock:
+            if self._db is None:
+                self._db = self._open()
+            row = self._db.execute(
+                "SELECT part_of_speech, definitions FROM words"
+                " WHERE spelling = ? AND reading = ?",
+                (spelling, reading),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0]), json.loads(row[1])
+
+    def stats(self) -> dict:
+        return {
+            "dictionary_hits": self.hits,
+            "dictionary_misses": self.misses,
+            "dictionary_build_seconds": round(self.build_seconds, 3),
+        }
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
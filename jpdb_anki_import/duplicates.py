@@ -0,0 +1,61 @@
+"""
+Find existing notes for a word before the importer creates a new one.
+"""
+
+import html
+import re
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+from anki.collection import Collection
+from anki.models import NotetypeDict
+from anki.notes import NoteId
+
+# What to do with a word that already has a note:
+# "create" a duplicate anyway, "skip" it, "update" the existing note's fields,
+# or only add its newer "reviews" to the existing note's cards.
+POLICIES = ("create", "skip", "update", "reviews")
+
+_TAG = re.compile(r"<[^>]*>")
+FIELD_SEPARATOR = "\x1f"
+
+
+def normalize(text: str) -> str:
+    """Reduce a field to the text that identifies a word."""
+    text = html.unescape(_TAG.sub("", text))
+    return unicodedata.normalize("NFKC", text).strip()
+
+
+class DuplicateIndex:
+    """In-memory index of a note type's notes by expression and reading.
+
+    The index is built with a single query over the note type's fields and reflects
+    the collection as it was before the import started.
+    """
+
+    def __init__(
+        self,
+        col: Collection,
+        note_model: NotetypeDict,
+        expression_field: str,
+        reading_field: str,
+    ):
+        field_map = col.models.field_map(note_model)
+        # Same fallbacks as JPDBImporter.new_note
+        expression = field_map[expression_field][0] if expression_field in field_map else 0
+        reading = field_map[reading_field][0] if reading_field in field_map else 1
+
+        self._notes: Dict[Tuple[str, str], NoteId] = {}
+        rows = col.db.all("select id, flds from notes where mid = ?", note_model["id"])
+        for note_id, fields in rows:
+            values = fields.split(FIELD_SEPARATOR)
+            if max(expression, reading) >= len(values):
+                continue
+            key = (normalize(values[expression]), normalize(values[reading]))
+            self._notes.setdefault(key, NoteId(note_id))
+
+    def __len__(self) -> int:
+        return len(self._notes)
+
+    def find(self, spelling: str, reading: str) -> Optional[NoteId]:
+        return self._notes.get((normalize(spelling), normalize(reading)))
@@ -2,16 +2,41 @@
 Create Notes and Cards in Anki for JPDB vocabulary cards.
 """
 
-from dataclasses import asdict
-from typing import Optional, Tuple
+import cProfile
+import contextlib
+import itertools
+import json
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-import aqt.qt
+# anki.collection comes first: importing anki.cards on its own runs into a
+# circular import inside anki.
+from anki.collection import Collection
 from anki.cards import Card
 from anki.decks import DeckId
-from anki.notes import Note
+from anki.notes import Note, NoteId
 from anki.scheduler.v3 import CardAnswer
 
-from . import config, jpdb, scraper
+try:
+    from anki.collection import AddNoteRequest
+except ImportError:
+    # Anki < 23.10 can only add one note at a time
+    AddNoteRequest = None
+
+from . import (
+    cache,
+    checkpoint,
+    compression,
+    config,
+    dictionary,
+    duplicates,
+    jpdb,
+    progress,
+    ratelimit,
+    scheduling,
+    scraper,
+    timing,
+)
 
 JPDB_TO_CARD_ANSWER = {
     "okay": CardAnswer.GOOD,
@@ -24,26 +49,84 @@ JPDB_TO_CARD_ANSWER = {
     "easy": CardAnswer.EASY,
     "pass": CardAnswer.GOOD,
 }
+# Marks grades without a rating in the grade code translation table
+NO_RATING = 0xFF
+
+# Notes are tagged with the JPDB vocabulary id they were created from, so that later
+# imports can find them again, unless Config.vid_field holds it instead.
+VID_TAG_PREFIX = "jpdb::vid::"
+
+# Notes are added to the collection this many at a time. Progress is reported,
+# and cancellation checked, between batches.
+BATCH_SIZE = 50
+
+
+def create_scraper(
+    conf: config.Config, rate_limiter: Optional[ratelimit.RateLimiter] = None
+) -> Optional[scraper.JPDBScraper]:
+    """Return the scraper the config asks for, if any. Close it after the import."""
+    lookups = conf.jpdb_cookie or conf.jpdb_api_key or conf.dictionary_file
+    if not (lookups and conf.scraped_jpdb_field_mapping):
+        return None
+    scrape_cache = cache.ScrapeCache() if conf.use_scrape_cache else None
+    local_dictionary = (
+        dictionary.Dictionary(conf.dictionary_file) if conf.dictionary_file else None
+    )
+    return scraper.JPDBScraper(
+        conf.jpdb_cookie,
+        scrape_cache,
+        rate_limiter=rate_limiter,
+        revalidate=conf.refresh_scraped_fields,
+        api_key=conf.jpdb_api_key,
+        local_dictionary=local_dictionary,
+        fields=conf.scraped_jpdb_field_mapping,
+    )
 
 
 class JPDBImporter:
     def __init__(
         self,
         conf: config.Config,
-        anki: aqt.AnkiQt,
+        col: Collection,
         jpdb_scraper: Optional[scraper.JPDBScraper] = None,
+        progress_reporter: Optional[progress.ProgressReporter] = None,
     ):
         self.config = conf
-        self.anki = anki
+        self.col = col
         self.jpdb_scraper = jpdb_scraper
+        self.progress = progress_reporter or progress.ProgressReporter()
+        self.notes_updated = 0
+        self.notes_skipped = 0
+        self.notes_refreshed = 0
+        self.notes_unchanged = 0
+        self.reviews_replayed = 0
+        self.words_resumed = 0
+        self.cancelled = False
+        self.profile = timing.ImportProfile()
+        self.note_model = col.models.get(conf.note_type_id) or col.models.current()
 
-    def create_note(self, vocab: jpdb.Vocabulary) -> Note:
-        note_model = (
-            self.anki.col.models.get(self.config.note_type_id)
-            or self.anki.col.models.current()
-        )
-        note = self.anki.col.new_note(note_model)
+        self.compressor = compression.ReviewCompressor.from_config(conf, col.crt)
+        # Rating of each grade code in jpdb.GRADES, rebuilt when the parser adds one
+        self._rating_table = b""
+        self._rating_table_grades = 0
+        # JP->EN and EN->JP template ordinals by note type id
+        self._template_ords: Dict[int, Tuple[Optional[int], Optional[int]]] = {}
+        self.offline_replay = None
+        if conf.replay_engine == "offline" and scheduling.OfflineReplay.supported(col):
+            self.offline_replay = scheduling.OfflineReplay(
+                col, conf.deck_id, actual_gaps=conf.replay_actual_gaps
+            )
+
+    def new_note(
+        self, vocab: jpdb.Vocabulary, scraped: Optional[scraper.Word] = None
+    ) -> Note:
+        note = self.col.new_note(self.note_model)
+        self.fill_note(note, vocab, scraped)
+        return note
 
+    def fill_note(
+        self, note: Note, vocab: jpdb.Vocabulary, scraped: Optional[scraper.Word] = None
+    ) -> None:
         if self.config.expression_field in note:
             note[self.config.expression_field] = vocab.spelling
         else:
@@ -54,108 +137,460 @@ class JPDBImporter:
         else:
             note.fields[1] = vocab.reading
 
-        if self.jpdb_scraper is not None:
-            scraped = self.jpdb_scraper.lookup_word(vocab)
-            if scraped:
-                for jpdb_field, value in scraped.as_dict().items():
-                    note_field = self.config.scraped_jpdb_field_mapping.get(jpdb_field)
-                    if note_field and value is not None:
-                        note[note_field] = value
+        if scraped:
+            for jpdb_field, value in scraped.provided_fields().items():
+                note_field = self.config.scraped_jpdb_field_mapping.get(jpdb_field)
+                if note_field and value is not None:
+                    note[note_field] = value
 
-        self.anki.col.add_note(note, DeckId(self.config.deck_id))
+        self.mark_imported(note, vocab.vid)
 
-        return note
+    def mark_imported(self, note: Note, vid: int) -> None:
+        """Record the word's vid on the note, for imported_notes()."""
+        if self.config.vid_field and self.config.vid_field in note:
+            note[self.config.vid_field] = str(vid)
+        else:
+            note.add_tag(f"{VID_TAG_PREFIX}{vid}")
+
+    def refresh_fields(self, note: Note, scraped: scraper.Word) -> bool:
+        """Rewrite the note's scraped fields whose content changed on JPDB.
+
+        Fields the lookup didn't provide are left alone. Returns whether any field
+        changed.
+        """
+        changed = False
+        for jpdb_field, value in scraped.provided_fields().items():
+            note_field = self.config.scraped_jpdb_field_mapping.get(jpdb_field)
+            if not note_field or note_field not in note:
+                continue
+            # A custom meaning or sentence removed on JPDB is cleared here too.
+            value = value or ""
+            if note[note_field] != value:
+                note[note_field] = value
+                changed = True
+        return changed
+
+    def add_notes(self, notes: List[Note]) -> None:
+        """Add notes to the import deck, in a single backend call where supported."""
+        deck_id = DeckId(self.config.deck_id)
+        if AddNoteRequest is None:
+            for note in notes:
+                self.col.add_note(note, deck_id)
+        elif notes:
+            self.col.add_notes(
+                [AddNoteRequest(note=note, deck_id=deck_id) for note in notes]
+            )
 
     def card_state_current_next(
-        self, card: Card, rating: str
+        self, card: Card, rating: int
     ) -> Tuple[CardAnswer, CardAnswer]:
         # The following code is taken directly from the Anki v3 scheduler
-        if hasattr(self.anki.col.backend, "get_scheduling_states"):
-            states = self.anki.col.backend.get_scheduling_states(card.id)
+        if hasattr(self.col.backend, "get_scheduling_states"):
+            states = self.col.backend.get_scheduling_states(card.id)
         else:
             # Anki < 2.1.60
-            states = self.anki.col.backend.get_next_card_states(card.id)
-        if rating == CardAnswer.AGAIN:
-            new_state = states.again
-        elif rating == CardAnswer.HARD:
-            new_state = states.hard
-        elif rating == CardAnswer.GOOD:
-            new_state = states.good
-        elif rating == CardAnswer.EASY:
-            new_state = states.easy
-        else:
-            raise Exception("invalid rating")
+            states = self.col.backend.get_next_card_states(card.id)
+        # Indexed by rating: AGAIN, HARD, GOOD, EASY
+        new_states = (states.again, states.hard, states.good, states.easy)
+        return states.current, new_states[rating]
 
-        return states.current, new_state
+    def ratings(self, reviews: jpdb.ReviewHistory) -> bytes:
+        """The CardAnswer rating of each review, one byte per review."""
+        if self._rating_table_grades != len(jpdb.GRADES):
+            self._rating_table = jpdb.grade_table(JPDB_TO_CARD_ANSWER, NO_RATING)
+            self._rating_table_grades = len(jpdb.GRADES)
+        ratings = reviews.grades.translate(self._rating_table)
+        if NO_RATING in ratings:
+            grade = jpdb.GRADES[reviews.grades[ratings.index(NO_RATING)]]
+            raise ValueError(f"unknown review grade: {grade!r}")
+        return ratings
+
+    def template_ords(self, note: Note) -> Tuple[Optional[int], Optional[int]]:
+        """Ordinals of the JP->EN and EN->JP card templates of the note's type."""
+        return self._note_type_template_ords(note.mid)
+
+    def _note_type_template_ords(
+        self, note_type_id: int
+    ) -> Tuple[Optional[int], Optional[int]]:
+        ords = self._template_ords.get(note_type_id)
+        if ords is None:
+            templates = self.col.models.get(note_type_id)["tmpls"]
+            by_name = {template["name"]: template["ord"] for template in templates}
+            ords = self._template_ords[note_type_id] = (
+                by_name.get(self.config.jp2en_card_name),
+                by_name.get(self.config.en2jp_card_name),
+            )
+        return ords
+
+    def imported_notes(self) -> Dict[int, NoteId]:
+        """Map JPDB vocabulary ids to the notes created for them by earlier imports."""
+        return dict(self.recorded_vids())
+
+    def recorded_vids(self) -> Iterator[Tuple[int, NoteId]]:
+        """Yield (vid, note id) for each vid recorded on a note by mark_imported().
+
+        A note that several words were merged into has the vid of each in its tags.
+        """
+        rows = self.col.db.all(
+            "select id, tags from notes where tags like ?", f"% {VID_TAG_PREFIX}%"
+        )
+        for note_id, tags in rows:
+            for tag in tags.split():
+                if tag.startswith(VID_TAG_PREFIX):
+                    yield int(tag[len(VID_TAG_PREFIX) :]), NoteId(note_id)
+        if not self.config.vid_field:
+            return
+        for note_type in self.col.models.all():
+            names = self.col.models.field_names(note_type)
+            if self.config.vid_field not in names:
+                continue
+            index = names.index(self.config.vid_field)
+            rows = self.col.db.all(
+                "select id, flds from notes where mid = ?", note_type["id"]
+            )
+            for note_id, fields in rows:
+                value = fields.split("\x1f")[index].strip()
+                if value.isdigit():
+                    yield int(value), NoteId(note_id)
+
+    def last_review_millis(self, card: Card) -> int:
+        """Time of the latest review already recorded for the card."""
+        # Revlog ids are the answer time in milliseconds.
+        return self.col.db.scalar(
+            "select coalesce(max(id), 0) from revlog where cid = ?", card.id
+        )
+
+    def has_new_reviews(self, note_id: NoteId, vocab: jpdb.Vocabulary) -> bool:
+        """Whether the word has reviews newer than the latest one in the review log
+        of the note's card for the same direction, which backfill() would replay."""
+        rows = self.col.db.all(
+            "select notes.mid, cards.ord, coalesce(max(revlog.id), 0) from cards"
+            " join notes on notes.id = cards.nid"
+            " left join revlog on revlog.cid = cards.id"
+            " where cards.nid = ? group by cards.id",
+            note_id,
+        )
+        if not rows:
+            return False
+        last_review = {template: last for _, template, last in rows}
+        jp_en_ord, en_jp_ord = self._note_type_template_ords(rows[0][0])
+        if jp_en_ord not in last_review:
+            # backfill() falls back to the first card
+            jp_en_ord = min(last_review)
+        for template, reviews in (
+            (jp_en_ord, vocab.jp_en_reviews),
+            (en_jp_ord, vocab.en_jp_reviews),
+        ):
+            if template in last_review and len(reviews):
+                if reviews.timestamps[-1] * 1000 > last_review[template]:
+                    return True
+        return False
+
+    def backfill_reviews(
+        self, card: Card, reviews: jpdb.ReviewHistory, since_millis: int = 0
+    ) -> None:
+        timestamps_ratings = zip(reviews.timestamps, self.ratings(reviews))
+        if since_millis:
+            timestamps_ratings = (
+                (timestamp, rating)
+                for timestamp, rating in timestamps_ratings
+                if timestamp * 1000 > since_millis
+            )
+
+        if self.offline_replay is not None:
+            self.reviews_replayed += self.offline_replay.replay(
+                card, timestamps_ratings, since_millis
+            )
+            return
 
-    def backfill_reviews(self, card: Card, reviews: list[jpdb.Review]) -> None:
-        for review in reviews:
-            rating = JPDB_TO_CARD_ANSWER[review.grade]
+        for timestamp, rating in timestamps_ratings:
+            start = time.perf_counter()
             current_state, new_state = self.card_state_current_next(card, rating)
+            self.profile.sample("scheduling_states", time.perf_counter() - start)
             card_answer = CardAnswer(
                 card_id=card.id,
                 current_state=current_state,
                 new_state=new_state,
                 rating=rating,
-                answered_at_millis=review.timestamp * 1000,
+                answered_at_millis=timestamp * 1000,
                 # Arbitrary
                 milliseconds_taken=1000,
             )
-            self.anki.col.sched.answer_card(card_answer)
-
-    def backfill(self, note: Note, vocab: jpdb.Vocabulary) -> None:
-        jp_en_card = None
-        en_jp_card = None
-        for card in note.cards():
-            template_name = card.template()["name"]
-            if template_name == self.config.jp2en_card_name:
-                jp_en_card = card
-            elif template_name == self.config.en2jp_card_name:
-                en_jp_card = card
+            start = time.perf_counter()
+            self.col.sched.answer_card(card_answer)
+            self.profile.sample("answer_card", time.perf_counter() - start)
+            self.reviews_replayed += 1
+
+    def backfill(
+        self, note: Note, vocab: jpdb.Vocabulary, incremental: bool = False
+    ) -> None:
+        """Replay the vocabulary's reviews on the note's cards.
+
+        With ``incremental``, only reviews newer than the last one already in a card's
+        review log are replayed.
+        """
+        cards = note.cards()
+        if self.offline_replay is not None and any(
+            self.offline_replay.pending(card.id) for card in cards
+        ):
+            # Another word already replayed onto this note; read its written state.
+            self.offline_replay.flush()
+            cards = note.cards()
+        jp_en_ord, en_jp_ord = self.template_ords(note)
+        by_ord = {card.ord: card for card in cards}
+        jp_en_card = by_ord.get(jp_en_ord)
+        en_jp_card = by_ord.get(en_jp_ord)
+
+        def replay(card, reviews):
+            reviews = self.compressor.compress(reviews)
+            since = self.last_review_millis(card) if incremental else 0
+            with self.profile.phase("replay"):
+                self.backfill_reviews(card, reviews, since)
 
         if en_jp_card:
-            self.backfill_reviews(en_jp_card, vocab.en_jp_reviews)
+            replay(en_jp_card, vocab.en_jp_reviews)
 
         # Always fill in JP->EN cards, otherwise what's the point.
         if jp_en_card:
-            self.backfill_reviews(jp_en_card, vocab.jp_en_reviews)
+            replay(jp_en_card, vocab.jp_en_reviews)
         else:
             # Fall back to assuming the first card for the note is the JP->EN card.
-            self.backfill_reviews(note.cards()[0], vocab.jp_en_reviews)
+            replay(cards[0], vocab.jp_en_reviews)
 
-    def create_notes(self, vocabulary: list[jpdb.Vocabulary]) -> int:
-        progress = aqt.qt.QProgressDialog(
-            "Importing from JPDB", "Cancel", 0, len(vocabulary), self.anki
-        )
-        bar = aqt.qt.QProgressBar(progress)
-        bar.setFormat("%v/%m")
-        bar.setMaximum(len(vocabulary))
-        progress.setBar(bar)
-        progress.setMinimumDuration(1000)
-        progress.setModal(True)
+    def plan(
+        self,
+        vocab: jpdb.Vocabulary,
+        existing: Dict[int, NoteId],
+        duplicate_index: Optional[duplicates.DuplicateIndex],
+    ) -> Tuple[str, Optional[NoteId]]:
+        """Decide what to do with a word: "create" a note, apply a
+        duplicates.POLICIES action to an existing one, or "refresh" the scraped
+        fields of a note created by an earlier import."""
+        note_id = existing.get(vocab.vid)
+        if note_id is not None:
+            return ("reviews" if self.config.incremental else "refresh"), note_id
+        if duplicate_index is not None:
+            note_id = duplicate_index.find(vocab.spelling, vocab.reading)
+            if note_id is not None:
+                return self.config.duplicate_policy, note_id
+        return "create", None
+
+    def plan_context(
+        self,
+    ) -> Tuple[Dict[int, NoteId], Optional[duplicates.DuplicateIndex]]:
+        """The existing notes that plan() matches words against."""
+        # Notes created by earlier imports only get their new reviews, or their
+        # refreshed scraped fields.
+        existing = {}
+        if self.config.incremental or self.config.refresh_scraped_fields:
+            existing = self.imported_notes()
+        duplicate_index = None
+        if self.config.duplicate_policy != "create":
+            with self.profile.phase("duplicate_index"):
+                duplicate_index = duplicates.DuplicateIndex(
+                    self.col,
+                    self.note_model,
+                    self.config.expression_field,
+                    self.config.reading_field,
+                )
+        return existing, duplicate_index
+
+    def create_notes(
+        self, vocabulary: Iterable[jpdb.Vocabulary], total: Optional[int] = None
+    ) -> int:
+        existing, duplicate_index = self.plan_context()
+
+        # Words completed by an interrupted import are in its checkpoint journal.
+        journal_path = checkpoint.journal_path(self.col.path)
+        if self.config.resume:
+            journal = checkpoint.Checkpoint.load(journal_path, self.config.review_file)
+            vocabulary = self._skip_completed(vocabulary, journal)
+            if total is not None:
+                total = max(total - len(journal), 0)
+        else:
+            journal = checkpoint.Checkpoint(journal_path, self.config.review_file)
+            journal.clear()
+
+        def needs_scraping(vocab):
+            return self.scrapes(self.plan(vocab, existing, duplicate_index)[0])
+
+        # The scraper reads ahead of note creation, so iterate the vocabulary twice.
+        vocabulary, to_scrape = itertools.tee(vocabulary)
+        to_scrape = filter(needs_scraping, to_scrape)
+        if self.jpdb_scraper is not None:
+            # Pages are fetched ahead of note creation on worker threads, but notes
+            # are still added to the collection from this thread only.
+            scraped_words = self.jpdb_scraper.lookup_words(
+                to_scrape, self.config.scrape_concurrency
+            )
+        else:
+            scraped_words = (None for _ in to_scrape)
 
         notes_created = 0
-        for i, vocab in enumerate(vocabulary):
-            progress.setValue(i)
-            progress.setLabelText(vocab.spelling)
-            if progress.wasCanceled():
-                break
+        done = 0
+        with contextlib.closing(scraped_words):
+            for batch in scraper.batches_of(vocabulary, BATCH_SIZE):
+                if self.progress.want_cancel():
+                    self.cancelled = True
+                    break
+                self.progress.update(f"Importing {batch[0].spelling}", done, total)
+
+                new_vocabulary = []
+                new_scraped = []
+                completed = []
+                for vocab in batch:
+                    action, note_id = self.plan(vocab, existing, duplicate_index)
+                    scraped = None
+                    if self.scrapes(action):
+                        # Scraped words arrive in vocabulary order.
+                        with self.profile.phase("scrape_wait"):
+                            scraped = next(scraped_words)
 
-            note = self.create_note(vocab)
+                    if action == "create":
+                        new_vocabulary.append(vocab)
+                        new_scraped.append(scraped)
+                    elif action == "skip":
+                        self.notes_skipped += 1
+                        completed.append((vocab.vid, None))
+                    elif (
+                        action == "reviews"
+                        and scraped is None
+                        and existing.get(vocab.vid) == note_id
+                        and not self.has_new_reviews(note_id, vocab)
+                    ):
+                        # Nothing to add to a note an earlier import created.
+                        self.notes_unchanged += 1
+                        completed.append((vocab.vid, note_id))
+                    else:
+                        self.update_note(note_id, vocab, action, scraped)
+                        completed.append((vocab.vid, note_id))
 
-            if note:
-                notes_created += 1
-                self.backfill(note, vocab)
+                with self.profile.phase("note_creation", len(new_vocabulary)):
+                    notes = list(map(self.new_note, new_vocabulary, new_scraped))
+                    self.add_notes(notes)
+                for note, vocab in zip(notes, new_vocabulary):
+                    self.backfill(note, vocab)
+                    completed.append((vocab.vid, note.id))
 
-        progress.setValue(len(vocabulary))
+                # Only checkpoint words whose reviews are in the collection.
+                if self.offline_replay is not None:
+                    with self.profile.phase("replay"):
+                        self.offline_replay.flush()
+                with self.profile.phase("checkpoint"):
+                    journal.record(completed)
 
+                notes_created += len(notes)
+                done += len(batch)
+
+        if not self.cancelled:
+            journal.clear()
         return notes_created
 
-    def run(self) -> dict:
-        vocabulary = jpdb.Vocabulary.parse(self.config.review_file)
+    def _skip_completed(
+        self, vocabulary: Iterable[jpdb.Vocabulary], journal: checkpoint.Checkpoint
+    ) -> Iterator[jpdb.Vocabulary]:
+        for vocab in vocabulary:
+            if vocab.vid in journal:
+                self.words_resumed += 1
+            else:
+                yield vocab
+
+    def scrapes(self, action: str) -> bool:
+        """Whether words planned for the action need their page scraped."""
+        if action in ("create", "update"):
+            return True
+        return self.config.refresh_scraped_fields and action in ("reviews", "refresh")
+
+    def update_note(
+        self,
+        note_id: NoteId,
+        vocab: jpdb.Vocabulary,
+        action: str,
+        scraped: Optional[scraper.Word] = None,
+    ) -> None:
+        """Apply the "update", "reviews" or "refresh" action to an existing note."""
+        note = self.col.get_note(note_id)
+        if action == "refresh":
+            # Notes whose scraped fields didn't change on JPDB are left alone.
+            if scraped is not None and self.refresh_fields(note, scraped):
+                self.col.update_note(note)
+                self.notes_refreshed += 1
+            return
+
+        if action == "update":
+            self.fill_note(note, vocab, scraped)
+        else:
+            if scraped is not None and self.refresh_fields(note, scraped):
+                self.notes_refreshed += 1
+            # Incremental imports find the note by vid next time (see plan_context).
+            self.mark_imported(note, vocab.vid)
+        self.col.update_note(note)
+        if action == "reviews":
+            self.backfill(note, vocab, incremental=True)
+        self.notes_updated += 1
+
+    def run(
+        self,
+        select: Optional[Callable[[jpdb.Vocabulary], bool]] = None,
+        total: Optional[int] = None,
+    ) -> dict:
+        """Import the review file, or only the words for which select is true.
+
+        total is the number of words select accepts, for the progress bar. Without
+        select, the words of the file are counted up front.
+        """
+        parsed = 0
+
+        def vocabulary():
+            nonlocal parsed
+            for vocab in jpdb.Vocabulary.iter_parse(self.config.review_file):
+                parsed += 1
+                if select is None or select(vocab):
+                    yield vocab
+
+        profiler = cProfile.Profile() if self.config.profile_file else None
+        start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            if select is None:
+                with self.profile.phase("count"):
+                    total = jpdb.Vocabulary.count(self.config.review_file)
+            notes_created = self.create_notes(
+                self.profile.iterate("parse", vocabulary()), total
+            )
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.config.profile_file)
+        elapsed = time.perf_counter() - start
+
+        replay_seconds = self.profile.seconds("replay")
         stats = {
-            "parsed": len(vocabulary),
-            "notes_created": self.create_notes(vocabulary),
+            "parsed": parsed,
+            "notes_created": notes_created,
+            "notes_updated": self.notes_updated,
+            "notes_skipped": self.notes_skipped,
+            "notes_refreshed": self.notes_refreshed,
+            "notes_unchanged": self.notes_unchanged,
+            "words_resumed": self.words_resumed,
+            "notes_per_second": round(notes_created / elapsed, 2) if elapsed else 0.0,
+            "reviews_replayed": self.reviews_replayed,
+            "reviews_per_second": round(self.reviews_replayed / replay_seconds, 2)
+            if replay_seconds
+            else 0.0,
+            "seconds": round(elapsed, 3),
+            **self.compressor.stats(),
         }
-        self.anki.overview.refresh()
+        if self.offline_replay is not None:
+            stats.update(self.offline_replay.stats())
+        if self.jpdb_scraper is not None:
+            stats.update(self.jpdb_scraper.stats())
+            self.profile.merge(self.jpdb_scraper.profile)
+        stats["profile"] = self.profile.report()
+
+        if self.config.report_file:
+            with open(self.config.report_file, "w", encoding="utf-8") as report:
+                json.dump(stats, report, indent=2)
         return stats
+
@@ -1,5 +1,132 @@
+import array
 import dataclasses
 import json
+import operator
+import re
+from typing import IO, Any, Collection, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Review lists in the JPDB export, and the Vocabulary attribute each one fills
+DIRECTIONS = {
+    "cards_vocabulary_en_jp": "en_jp_reviews",
+    "cards_vocabulary_jp_en": "jp_en_reviews",
+}
+CHUNK_SIZE = 1 << 16
+# Review grades used by JPDB. Reviews store the index of their grade in this list;
+# grades not listed here are appended the first time they are seen.
+GRADES: List[str] = [
+    "okay",
+    "known",
+    "unknown",
+    "hard",
+    "something",
+    "fail",
+    "nothing",
+    "easy",
+    "pass",
+]
+_GRADE_CODES = {grade: code for code, grade in enumerate(GRADES)}
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _JSONStream:
+    """Minimal pull parser that reads a JSON document one value at a time."""
+
+    def __init__(self, fp: IO[str]):
+        self._fp = fp
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size: Optional[int] = None) -> bool:
+        # CHUNK_SIZE is looked up on each call, so that tests can shrink it.
+        chunk = self._fp.read(size or CHUNK_SIZE)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace and return the next character without consuming it."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buf, self._pos).end()
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                raise json.JSONDecodeError("Unexpected end of file", self._buf, self._pos)
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting {char!r}", self._buf, self._pos)
+        self._pos += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self._buf, self._pos)
+            except json.JSONDecodeError:
+                # Double the unread part of the buffer on each retry, so that a
+                # large value is decoded O(log n) times rather than once per chunk.
+                if not self._fill(max(CHUNK_SIZE, len(self._buf) - self._pos)):
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next chunk.
+            if end == len(self._buf) and self._fill():
+                continue
+            self._pos = end
+            return obj
+
+    def items(self, close: str) -> Iterator[None]:
+        """Step through the items of the array or object just opened, stopping
+        before each value; the caller has to consume it."""
+        if self.peek() == close:
+            self._pos += 1
+            return
+        while True:
+            yield
+            if self.peek() != ",":
+                self.expect(close)
+                return
+            self.expect(",")
+
+    def skip(self) -> None:
+        """Consume the next value. Arrays and objects are decoded one item at a time
+        and discarded, rather than buffered and decoded whole."""
+        char = self.peek()
+        if char == "[":
+            self.expect("[")
+            for _ in self.items("]"):
+                self.value()
+        elif char == "{":
+            self.expect("{")
+            for _ in self.items("}"):
+                self.value()
+                self.expect(":")
+                self.value()
+        else:
+            self.value()
+
+
+def _iter_array_items(fp: IO[str], keys: Collection[str]) -> Iterator[Tuple[str, Any]]:
+    """Yield (key, item) for each item of the top-level arrays named in keys.
+
+    Other top-level values are skipped item by item, so only one array item has to
+    be held in memory at a time.
+    """
+    stream = _JSONStream(fp)
+    stream.expect("{")
+    for _ in stream.items("}"):
+        key = stream.value()
+        stream.expect(":")
+        if key in keys and stream.peek() == "[":
+            stream.expect("[")
+            for _ in stream.items("]"):
+                yield key, stream.value()
+        else:
+            stream.skip()
 
 
 @dataclasses.dataclass
@@ -12,13 +139,80 @@ class Review:
         return cls(timestamp=d["timestamp"], grade=d["grade"])
 
 
+def grade_code(grade: str) -> int:
+    code = _GRADE_CODES.get(grade)
+    if code is None:
+        if len(GRADES) > 255:
+            raise ValueError(f"too many distinct review grades: {grade!r}")
+        code = _GRADE_CODES[grade] = len(GRADES)
+        GRADES.append(grade)
+    return code
+
+
+def grade_table(values: Dict[str, int], missing: int) -> bytes:
+    """A bytes.translate table mapping each grade code to the value of its grade.
+
+    Codes of grades without a value, or not in GRADES yet, map to ``missing``.
+    """
+    return bytes(
+        values.get(GRADES[code], missing) if code < len(GRADES) else missing
+        for code in range(256)
+    )
+
+
+class ReviewHistory:
+    """The reviews of one card in time order, packed into two flat arrays.
+
+    ``timestamps`` holds the review times and ``grades`` one byte per review with
+    the index of its grade in GRADES. Iterating yields Review objects; use pairs()
+    to walk the history without creating one object per review.
+    """
+
+    __slots__ = ("timestamps", "grades")
+
+    def __init__(self, timestamps: Iterable[int] = (), grades: bytes = b""):
+        self.timestamps = array.array("q", timestamps)
+        self.grades = bytes(grades)
+
+    @classmethod
+    def from_dicts(cls, reviews: Iterable[dict]) -> "ReviewHistory":
+        ordered = sorted(
+            ((r["timestamp"], grade_code(r["grade"])) for r in reviews),
+            key=operator.itemgetter(0),
+        )
+        return cls(
+            (timestamp for timestamp, _ in ordered), bytes(code for _, code in ordered)
+        )
+
+    def pairs(self) -> Iterator[Tuple[int, str]]:
+        """Yield (timestamp, grade) for each review."""
+        return zip(self.timestamps, map(GRADES.__getitem__, self.grades))
+
+    def __iter__(self) -> Iterator[Review]:
+        for timestamp, grade in self.pairs():
+            yield Review(grade=grade, timestamp=timestamp)
+
+    def __len__(self) -> int:
+        return len(self.grades)
+
+    def __eq__(self, other):
+        if not isinstance(other, ReviewHistory):
+            return NotImplemented
+        return self.timestamps == other.timestamps and self.grades == other.grades
+
+    def __repr__(self):
+        return f"ReviewHistory({list(self)!r})"
+
+
 @dataclasses.dataclass
 class Vocabulary:
     vid: int
     spelling: str
     reading: str
-    en_jp_reviews: list[Review] = dataclasses.field(default_factory=list)
-    jp_en_reviews: list[Review] = dataclasses.field(default_factory=list)
+    en_jp_reviews: ReviewHistory = dataclasses.field(default_factory=ReviewHistory)
+    jp_en_reviews: ReviewHistory = dataclasses.field(default_factory=ReviewHistory)
+    # JPDB's spelling id, needed by its API; only newer exports include it
+    sid: Optional[int] = None
 
     def __eq__(self, other):
         if not isinstance(other, self.__class__):
@@ -45,6 +239,7 @@ class Vocabulary:
                 spelling=vocab["spelling"],
                 reading=vocab["reading"],
                 en_jp_reviews=cls._build_reviews(vocab["reviews"]),
+                sid=vocab.get("sid"),
             )
 
         for vocab in reviews.get("cards_vocabulary_jp_en", []):
@@ -59,10 +254,66 @@ class Vocabulary:
                     spelling=vocab["spelling"],
                     reading=vocab["reading"],
                     jp_en_reviews=reviews,
+                    sid=vocab.get("sid"),
                 )
 
         return list(by_vid.values())
 
+    @classmethod
+    def iter_parse(cls, filename) -> Iterator["Vocabulary"]:
+        """Parse the export incrementally, yielding vocabulary while reading it.
+
+        Cards from whichever review list comes first in the file are held until the
+        other list has been read, so they can be merged with the matching card from
+        the other direction. Every card of the second list is yielded as soon as it
+        has been read.
+
+        Peak memory therefore still grows with the first list: the file can't say
+        which of its cards have no partner before the end of the second list. Only
+        the JSON text and the parsed second list are streamed. benchmarks/memory.py
+        measures the peak of a consumer that keeps nothing ("iter_parse_stream").
+        """
+        pending = {}
+        first_key = None
+        with open(filename, "r", encoding="utf-8") as review_file:
+            for key, vocab in _iter_array_items(review_file, DIRECTIONS):
+                if first_key is None:
+                    first_key = key
+
+                vid = vocab["vid"]
+                if key == first_key:
+                    entry = pending[vid] = cls(
+                        vid=vid,
+                        spelling=vocab["spelling"],
+                        reading=vocab["reading"],
+                        sid=vocab.get("sid"),
+                    )
+                else:
+                    entry = pending.pop(vid, None) or cls(
+                        vid=vid,
+                        spelling=vocab["spelling"],
+                        reading=vocab["reading"],
+                        sid=vocab.get("sid"),
+                    )
+                    if key == "cards_vocabulary_en_jp":
+                        # Like parse(), the EN->JP card decides the spelling.
+                        entry.spelling = vocab["spelling"]
+                        entry.reading = vocab["reading"]
+                        entry.sid = vocab.get("sid")
+                setattr(entry, DIRECTIONS[key], cls._build_reviews(vocab["reviews"]))
+
+                if key != first_key:
+                    yield entry
+
+        yield from pending.values()
+
+    @staticmethod
+    def count(filename) -> int:
+        """The number of words in the export, without building their reviews."""
+        with open(filename, "r", encoding="utf-8") as review_file:
+            items = _iter_array_items(review_file, DIRECTIONS)
+            return len({vocab["vid"] for _, vocab in items})
+
     @staticmethod
-    def _build_reviews(reviews) -> list[Review]:
-        return sorted((Review.from_dict(r) for r in reviews), key=lambda x: x.timestamp)
+    def _build_reviews(reviews) -> ReviewHistory:
+        return ReviewHistory.from_dicts(reviews)
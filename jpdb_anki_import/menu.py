@@ -0,0 +1,110 @@
+"""
+The "Import from JPDB" action in Anki's Tools menu.
+"""
+
+import os
+
+import aqt.qt
+from aqt import mw
+from anki.collection import OpChanges
+from aqt.operations import CollectionOp
+from aqt.qt import *
+from aqt.utils import showInfo
+
+# Report of the last import run from Anki, saved in the add-on's user_files
+REPORT_FILE = "last_import_report.json"
+
+
+def check_initial_state() -> bool:
+    if not mw.col.v3_scheduler():
+        showInfo(
+            "This plugin only works with Anki v3 scheduler. "
+            'Please enable this under the "Scheduling" tab under Anki general settings.'
+        )
+        return False
+
+    return True
+
+
+def import_jpdb() -> None:
+    if not check_initial_state():
+        return
+
+    # Imported on first use rather than at Anki startup: the importer pulls in
+    # the scheduler and, when scraping, the vendored BeautifulSoup.
+    from . import cache, gui, importer, progress
+
+    option_dialog = gui.ConfigGUI(mw)
+    if option_dialog.exec() == aqt.qt.QDialog.DialogCode.Accepted:
+        c = option_dialog.config
+    else:
+        return
+
+    if not c.report_file:
+        os.makedirs(cache.USER_FILES_DIR, exist_ok=True)
+        c.report_file = os.path.join(cache.USER_FILES_DIR, REPORT_FILE)
+
+    jpdb_scraper = importer.create_scraper(c)
+
+    def close():
+        if jpdb_scraper is not None:
+            jpdb_scraper.close()
+
+    stats = {}
+
+    def on_success(_changes) -> None:
+        close()
+        mw.overview.refresh()
+        message = f'parsed {stats["parsed"]} vocabulary words from JPDB, created {stats["notes_created"]} notes'
+        if stats["words_resumed"]:
+            message += f' (resuming after {stats["words_resumed"]} words imported earlier)'
+        if stats["notes_updated"]:
+            message += f', added new reviews to {stats["notes_updated"]} existing notes'
+        if stats["notes_refreshed"]:
+            message += f', refreshed the scraped fields of {stats["notes_refreshed"]} notes'
+        if "cache_hits" in stats:
+            message += f' ({stats["cache_hits"]} pages cached, {stats["cache_misses"]} scraped)'
+        if "dictionary_hits" in stats:
+            message += f' ({stats["dictionary_hits"]} words found in the dictionary)'
+        if imp.cancelled:
+            message += ". The import was cancelled; resume it from the import dialog"
+        if imp.offline_replay is not None:
+            message += ". Imports with the offline review replay can't be undone"
+        showInfo(message)
+
+    def on_failure(e: Exception) -> None:
+        close()
+        raise Exception(f"Could not import {c.review_file}") from e
+
+    # Parsing, scraping and collection writes all happen on a background thread;
+    # the importer posts throttled progress updates back to the UI.
+    imp = importer.JPDBImporter(
+        c, mw.col, jpdb_scraper, progress.AnkiProgressReporter(mw)
+    )
+
+    def op(col):
+        if imp.offline_replay is not None:
+            # The offline replay writes review logs with raw SQL, which makes
+            # Anki discard its undo queue, so there is no undo step to merge into.
+            stats.update(imp.run())
+            return OpChanges(
+                card=True,
+                note=True,
+                tag=True,
+                browser_table=True,
+                note_text=True,
+                study_queues=True,
+            )
+        # Fold every note added and review replayed into a single undo step.
+        undo_entry = col.add_custom_undo_entry("Import from JPDB")
+        stats.update(imp.run())
+        return col.merge_undo_entries(undo_entry)
+
+    CollectionOp(parent=mw, op=op).success(on_success).failure(
+        on_failure
+    ).run_in_background()
+
+
+action = QAction("Import from JPDB", mw)
+qconnect(action.triggered, import_jpdb)
+mw.form.menuTools.addAction(action)
@@ -0,0 +1,62 @@
+"""
+Progress reporting for imports running in Anki or on the command line.
+"""
+
+import sys
+import time
+from typing import Optional, TextIO
+
+# Minimum number of seconds between two updates posted to the UI
+UPDATE_INTERVAL = 0.1
+
+
+class ProgressReporter:
+    """Receives progress from the importer. This base reporter ignores it."""
+
+    def update(self, label: str, value: int, maximum: Optional[int] = None) -> None:
+        pass
+
+    def want_cancel(self) -> bool:
+        return False
+
+
+class AnkiProgressReporter(ProgressReporter):
+    """Forward progress to Anki's progress window from a background thread.
+
+    Updates are throttled to one per UPDATE_INTERVAL and posted to the main thread,
+    so a tight import loop doesn't flood the UI event queue.
+    """
+
+    def __init__(self, mw, interval: float = UPDATE_INTERVAL):
+        self._mw = mw
+        self._interval = interval
+        self._last_update = 0.0
+
+    def update(self, label: str, value: int, maximum: Optional[int] = None) -> None:
+        now = time.monotonic()
+        if now - self._last_update < self._interval:
+            return
+        self._last_update = now
+        self._mw.taskman.run_on_main(
+            lambda: self._mw.progress.update(label=label, value=value, max=maximum)
+        )
+
+    def want_cancel(self) -> bool:
+        return self._mw.progress.want_cancel()
+
+
+class ConsoleProgressReporter(ProgressReporter):
+    """Print progress to a terminal, at most once per ``interval`` seconds."""
+
+    def __init__(self, stream: TextIO = sys.stderr, interval: float = 1.0):
+        self._stream = stream
+        self._interval = interval
+        self._last_update = 0.0
+
+    def update(self, label: str, value: int, maximum: Optional[int] = None) -> None:
+        now = time.monotonic()
+        if now - self._last_update < self._interval:
+            return
+        self._last_update = now
+        count = f"{value}/{maximum}" if maximum else str(value)
+        print(f"[{count}] {label}", file=self._stream, flush=True)
@@ -0,0 +1,110 @@
+"""
+Request pacing for the JPDB scraper.
+"""
+
+import email.utils
+import random
+import threading
+import time
+from typing import Optional
+
+# Requests per second the limiter starts at, and the most it will ramp up to
+DEFAULT_RATE = 5.0
+DEFAULT_MAX_RATE = 20.0
+MIN_RATE = 0.2
+DEFAULT_BURST = 5
+# Additive increase per successful request, multiplicative decrease when throttled
+RATE_INCREASE = 0.05
+RATE_DECREASE = 0.5
+
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 60.0
+
+# Status codes JPDB uses to tell us to slow down
+THROTTLED_STATUSES = (429, 503)
+
+
+def backoff(attempt: int) -> float:
+    """Seconds to wait before retry number ``attempt``, with full jitter."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either in seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RateLimiter:
+    """Token bucket shared by all scraper workers.
+
+    The refill rate adapts to the server: it creeps up by ``RATE_INCREASE`` after
+    every successful request and is cut by ``RATE_DECREASE`` whenever a request is
+    throttled. A Retry-After delay blocks every worker until it has passed.
+    """
+
+    def __init__(
+        self,
+        rate: float = DEFAULT_RATE,
+        max_rate: float = DEFAULT_MAX_RATE,
+        burst: int = DEFAULT_BURST,
+    ):
+        self._rate = rate
+        self._max_rate = max(rate, max_rate)
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.throttled_count = 0
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._tokens = min(self._burst, self._tokens + elapsed * self._rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        """Block until a request may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._blocked_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self._rate
+            time.sleep(wait)
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self._rate = min(self._max_rate, self._rate + RATE_INCREASE)
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.throttled_count += 1
+            self._rate = max(MIN_RATE, self._rate * RATE_DECREASE)
+            self._tokens = 0.0
+            if retry_after is not None:
+                self._blocked_until = max(
+                    self._blocked_until, time.monotonic() + retry_after
+                )
+
+    def stats(self) -> dict:
+        return {
+            "throttled_requests": self.throttled_count,
+            "request_rate": round(self._rate, 2),
+        }
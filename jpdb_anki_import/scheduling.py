@@ -0,0 +1,617 @@
+"""
+Offline replay of JPDB review histories with Anki's SM-2 scheduling rules.
+
+Instead of asking the backend for the next scheduling states and answering the
+card once per review, the card's whole history is run through a Python port of the
+v3 scheduler's SM-2 state machine. The resulting review log rows and final card
+states are buffered and written in bulk, one chunk of cards at a time.
+
+The port follows rslib's scheduler/states module, except that intervals are not
+fuzzed: Anki seeds its fuzz with a Rust RNG per card, which can't be reproduced
+here. Scheduler.interval_range gives the range the fuzz could have picked from.
+
+Like the backend replay, every review counts as answered on time, and cards are
+scheduled from the day of the import: the backend measures elapsed days with its
+own day counter, not with the review's timestamp. With ``actual_gaps``, elapsed
+days are instead counted between the historical reviews, and cards scheduled from
+their last review, which gives other intervals than the backend replay.
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import math
+import time
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
+
+if TYPE_CHECKING:
+    # Only annotations need Anki, so the state machine can be tested without it.
+    from anki.cards import Card
+    from anki.collection import Collection
+
+
+# Card.type / Card.queue values
+CARD_TYPE_NEW = 0
+CARD_TYPE_LRN = 1
+CARD_TYPE_REV = 2
+CARD_TYPE_RELEARNING = 3
+QUEUE_TYPE_LRN = 1
+QUEUE_TYPE_REV = 2
+QUEUE_TYPE_DAY_LEARN_RELEARN = 3
+
+# Number of replayed cards whose review log rows and states are written together
+CHUNK_CARDS = 500
+# Transitions a Scheduler remembers before it starts over with an empty memo
+MAX_TRANSITIONS = 100_000
+
+# Revlog review kinds
+REVLOG_LRN = 0
+REVLOG_REV = 1
+REVLOG_RELRN = 2
+
+# Ratings, matching anki.scheduler.v3.CardAnswer.Rating
+AGAIN = 0
+HARD = 1
+GOOD = 2
+EASY = 3
+
+MINIMUM_EASE = 1.3
+EASE_DELTA_AGAIN = -0.2
+EASE_DELTA_HARD = -0.15
+EASE_DELTA_EASY = 0.15
+
+SECONDS_PER_DAY = 86400
+# (start, end, factor) of rslib's review fuzz: intervals between start and end days
+# add factor days of fuzz per day
+FUZZ_RANGES = ((2.5, 7.0, 0.15), (7.0, 20.0, 0.1), (20.0, math.inf, 0.05))
+# Time recorded as spent on each review, like the backend replay does
+REVIEW_MILLIS = 1000
+
+
+@dataclasses.dataclass(frozen=True)
+class SchedulerParams:
+    """The SM-2 settings of a deck options preset."""
+
+    learn_steps: Tuple[float, ...] = (1.0, 10.0)
+    relearn_steps: Tuple[float, ...] = (10.0,)
+    graduating_interval_good: int = 1
+    graduating_interval_easy: int = 4
+    initial_ease: float = 2.5
+    easy_multiplier: float = 1.3
+    hard_multiplier: float = 1.2
+    lapse_multiplier: float = 0.0
+    interval_multiplier: float = 1.0
+    maximum_interval: int = 36500
+    minimum_lapse_interval: int = 1
+
+    @classmethod
+    def from_deck_config(cls, conf: dict) -> "SchedulerParams":
+        """Read the parameters from a legacy deck config dict."""
+        new, lapse, rev = conf["new"], conf["lapse"], conf["rev"]
+        return cls(
+            learn_steps=tuple(new["delays"]),
+            relearn_steps=tuple(lapse["delays"]),
+            graduating_interval_good=new["ints"][0],
+            graduating_interval_easy=new["ints"][1],
+            initial_ease=new["initialFactor"] / 1000,
+            easy_multiplier=rev["ease4"],
+            hard_multiplier=rev.get("hardFactor", 1.2),
+            lapse_multiplier=lapse["mult"],
+            interval_multiplier=rev.get("ivlFct", 1.0),
+            maximum_interval=rev["maxIvl"],
+            minimum_lapse_interval=lapse["minInt"],
+        )
+
+
+@dataclasses.dataclass(frozen=True)
+class CardState:
+    """Scheduling state of a card, like rslib's CardState.
+
+    ``kind`` is one of "new", "learning", "review" or "relearning". Relearning cards
+    keep the interval and ease they return to in ``scheduled_days``/``ease_factor``.
+    """
+
+    kind: str = "new"
+    remaining_steps: int = 0
+    scheduled_secs: int = 0
+    scheduled_days: int = 0
+    ease_factor: float = 0.0
+    lapses: int = 0
+
+    @property
+    def interval(self) -> int:
+        """The interval as stored in the review log: negative seconds when learning."""
+        if self.kind == "review":
+            return self.scheduled_days
+        return -self.scheduled_secs
+
+    @classmethod
+    def from_card(cls, card: Card) -> "CardState":
+        if card.type == CARD_TYPE_NEW:
+            return cls()
+        if card.type == CARD_TYPE_LRN:
+            return cls("learning", remaining_steps=card.left % 1000)
+        ease = card.factor / 1000
+        if card.type == CARD_TYPE_RELEARNING:
+            return cls(
+                "relearning",
+                remaining_steps=card.left % 1000,
+                scheduled_days=card.ivl,
+                ease_factor=ease,
+                lapses=card.lapses,
+            )
+        return cls(
+            "review", scheduled_days=card.ivl, ease_factor=ease, lapses=card.lapses
+        )
+
+
+def _step_secs(steps: Tuple[float, ...], index: int) -> Optional[int]:
+    if 0 <= index < len(steps):
+        return int(steps[index] * 60)
+    return None
+
+
+def _hard_delay_secs(steps: Tuple[float, ...], remaining: int) -> int:
+    index = max(0, len(steps) - remaining)
+    current = _step_secs(steps, index) or 0
+    if index == 0:
+        following = _step_secs(steps, 1)
+        if following is not None:
+            return (current + following) // 2
+        return int(min(current * 1.5, current + SECONDS_PER_DAY))
+    return current
+
+
+def _round(value: float) -> int:
+    # Round half up like Rust's f32::round, not to even like Python's round()
+    return math.floor(value + 0.5)
+
+
+def _constrain_interval(
+    params: SchedulerParams, interval: float, minimum: int
+) -> int:
+    interval *= params.interval_multiplier
+    interval = min(max(interval, minimum), params.maximum_interval)
+    return max(1, _round(interval))
+
+
+def fuzz_bounds(interval: float, minimum: int, maximum: int) -> Tuple[int, int]:
+    """The fewest and most days the backend's fuzz can turn interval into, like
+    rslib's constrained_fuzz_bounds."""
+    minimum = min(minimum, maximum)
+    interval = min(max(interval, minimum), maximum)
+    delta = 0.0
+    if interval >= 2.5:
+        delta = 1.0 + sum(
+            factor * max(min(interval, end) - start, 0.0)
+            for start, end, factor in FUZZ_RANGES
+        )
+    lower = min(max(_round(interval - delta), minimum), maximum)
+    upper = min(max(_round(interval + delta), minimum), maximum)
+    if upper == lower and 2 < upper < maximum:
+        upper = lower + 1
+    return lower, upper
+
+
+class Scheduler:
+    """Pure SM-2 state transitions for one set of SchedulerParams.
+
+    Transitions are memoized by (state, rating, elapsed days): many cards share
+    their histories, like a single "known" review or the same fail/pass sequence
+    at the same spacing, and so run through the same transitions. Only review
+    states depend on the elapsed days, so other states are remembered without.
+    """
+
+    def __init__(self, params: SchedulerParams):
+        self.params = params
+        self._transitions: Dict[Tuple[CardState, int, int], CardState] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def next_state(
+        self, state: CardState, rating: int, elapsed_days: int
+    ) -> CardState:
+        key = (state, rating, elapsed_days if state.kind == "review" else 0)
+        new_state = self._transitions.get(key)
+        if new_state is not None:
+            self.hits += 1
+            return new_state
+        self.misses += 1
+        new_state = self._next_state(state, rating, elapsed_days)
+        if len(self._transitions) >= MAX_TRANSITIONS:
+            self._transitions.clear()
+        self._transitions[key] = new_state
+        return new_state
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "transition_cache": {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+        }
+
+    def interval_range(
+        self, state: CardState, rating: int, elapsed_days: int
+    ) -> Tuple[int, int]:
+        """The range of intervals the backend's fuzz could give the card after the
+        answer. Only review intervals are fuzzed; for other answers both ends are
+        the interval of next_state()."""
+        new_state = self.next_state(state, rating, elapsed_days)
+        if new_state.kind != "review" or rating == AGAIN:
+            return new_state.interval, new_state.interval
+        if state.kind in ("new", "learning"):
+            return fuzz_bounds(
+                new_state.scheduled_days, 1, self.params.maximum_interval
+            )
+        if state.kind == "relearning":
+            return new_state.interval, new_state.interval
+        return self._passing_ranges(state, elapsed_days)[rating - HARD]
+
+    def _passing_ranges(
+        self, state: CardState, elapsed_days: int
+    ) -> List[Tuple[int, int]]:
+        """Fuzz ranges of the hard, good and easy intervals of a review card.
+
+        The backend fuzzes each interval before the next one's minimum is taken from
+        it, so those minimums span a range too.
+        """
+        p = self.params
+        current = state.scheduled_days
+        days_late = elapsed_days - current
+        if days_late < 0:
+            return [
+                fuzz_bounds(days, 1, p.maximum_interval)
+                for days in self._passing_intervals(state, elapsed_days)
+            ]
+
+        def fuzzed(interval: float, lowest: int, highest: int) -> Tuple[int, int]:
+            interval *= p.interval_multiplier
+            return (
+                fuzz_bounds(interval, max(lowest, 1), p.maximum_interval)[0],
+                fuzz_bounds(interval, max(highest, 1), p.maximum_interval)[1],
+            )
+
+        hard_minimum = 0 if p.hard_multiplier <= 1 else current + 1
+        hard = fuzzed(current * p.hard_multiplier, hard_minimum, hard_minimum)
+        if p.hard_multiplier <= 1:
+            good_minimums = (current + 1, current + 1)
+        else:
+            good_minimums = (hard[0] + 1, hard[1] + 1)
+        good = fuzzed(
+            (current + days_late / 2) * state.ease_factor, *good_minimums
+        )
+        easy = fuzzed(
+            (current + days_late) * state.ease_factor * p.easy_multiplier,
+            good[0] + 1,
+            good[1] + 1,
+        )
+        return [hard, good, easy]
+
+    def _next_state(
+        self, state: CardState, rating: int, elapsed_days: int
+    ) -> CardState:
+        if state.kind in ("new", "learning"):
+            return self._next_learning(state, rating)
+        if state.kind == "review":
+            return self._next_review(state, rating, elapsed_days)
+        return self._next_relearning(state, rating)
+
+    def _graduate(self, rating: int) -> CardState:
+        p = self.params
+        if rating == EASY:
+            days = max(p.graduating_interval_easy, p.graduating_interval_good + 1)
+        else:
+            days = p.graduating_interval_good
+        return CardState("review", scheduled_days=days, ease_factor=p.initial_ease)
+
+    def _next_learning(self, state: CardState, rating: int) -> CardState:
+        steps = self.params.learn_steps
+        remaining = state.remaining_steps if state.kind == "learning" else len(steps)
+        if not steps or rating == EASY:
+            # Without learning steps every answer but Easy graduates like Good.
+            return self._graduate(EASY if rating == EASY else GOOD)
+        if rating == AGAIN:
+            return CardState(
+                "learning", remaining_steps=len(steps), scheduled_secs=_step_secs(steps, 0)
+            )
+        if rating == HARD:
+            return CardState(
+                "learning",
+                remaining_steps=remaining,
+                scheduled_secs=_hard_delay_secs(steps, remaining),
+            )
+        good_secs = _step_secs(steps, len(steps) - remaining + 1)
+        if good_secs is None:
+            return self._graduate(GOOD)
+        return CardState(
+            "learning", remaining_steps=remaining - 1, scheduled_secs=good_secs
+        )
+
+    def _next_review(
+        self, state: CardState, rating: int, elapsed_days: int
+    ) -> CardState:
+        p = self.params
+        if rating == AGAIN:
+            days = max(
+                int(state.scheduled_days * p.lapse_multiplier),
+                p.minimum_lapse_interval,
+                1,
+            )
+            ease = max(MINIMUM_EASE, state.ease_factor + EASE_DELTA_AGAIN)
+            if p.relearn_steps:
+                return CardState(
+                    "relearning",
+                    remaining_steps=len(p.relearn_steps),
+                    scheduled_secs=_step_secs(p.relearn_steps, 0),
+                    scheduled_days=days,
+                    ease_factor=ease,
+                    lapses=state.lapses + 1,
+                )
+            return CardState(
+                "review", scheduled_days=days, ease_factor=ease, lapses=state.lapses + 1
+            )
+
+        hard, good, easy = self._passing_intervals(state, elapsed_days)
+        if rating == HARD:
+            days, delta = hard, EASE_DELTA_HARD
+        elif rating == GOOD:
+            days, delta = good, 0.0
+        else:
+            days, delta = easy, EASE_DELTA_EASY
+        return CardState(
+            "review",
+            scheduled_days=days,
+            ease_factor=max(MINIMUM_EASE, state.ease_factor + delta),
+            lapses=state.lapses,
+        )
+
+    def _passing_intervals(
+        self, state: CardState, elapsed_days: int
+    ) -> Tuple[int, int, int]:
+        p = self.params
+        current = state.scheduled_days
+        days_late = elapsed_days - current
+        if days_late < 0:
+            # Answered before it was due
+            elapsed = max(elapsed_days, 0)
+            hard = _constrain_interval(
+                p,
+                max(elapsed * p.hard_multiplier, current * p.hard_multiplier / 2),
+                0,
+            )
+            good = _constrain_interval(
+                p, max(elapsed * state.ease_factor, current), 0
+            )
+            reduced_bonus = p.easy_multiplier - (p.easy_multiplier - 1) / 2
+            easy = _constrain_interval(
+                p, max(elapsed * state.ease_factor, current) * reduced_bonus, 0
+            )
+            return hard, good, easy
+
+        hard_minimum = 0 if p.hard_multiplier <= 1 else current + 1
+        hard = _constrain_interval(p, current * p.hard_multiplier, hard_minimum)
+        good_minimum = current + 1 if p.hard_multiplier <= 1 else hard + 1
+        good = _constrain_interval(
+            p, (current + days_late / 2) * state.ease_factor, good_minimum
+        )
+        easy = _constrain_interval(
+            p, (current + days_late) * state.ease_factor * p.easy_multiplier, good + 1
+        )
+        return hard, good, easy
+
+    def _next_relearning(self, state: CardState, rating: int) -> CardState:
+        steps = self.params.relearn_steps
+        if rating == EASY or not steps:
+            extra = 1 if rating == EASY else 0
+            return dataclasses.replace(
+                state,
+                kind="review",
+                remaining_steps=0,
+                scheduled_secs=0,
+                scheduled_days=state.scheduled_days + extra,
+            )
+        if rating == AGAIN:
+            return dataclasses.replace(
+                state, remaining_steps=len(steps), scheduled_secs=_step_secs(steps, 0)
+            )
+        if rating == HARD:
+            return dataclasses.replace(
+                state, scheduled_secs=_hard_delay_secs(steps, state.remaining_steps)
+            )
+        good_secs = _step_secs(steps, len(steps) - state.remaining_steps + 1)
+        if good_secs is None:
+            return dataclasses.replace(
+                state, kind="review", remaining_steps=0, scheduled_secs=0
+            )
+        return dataclasses.replace(
+            state, remaining_steps=state.remaining_steps - 1, scheduled_secs=good_secs
+        )
+
+
+@dataclasses.dataclass
+class ReplayResult:
+    state: CardState
+    # (id, ease, ivl, lastIvl, factor, time, type) per review, without cid/usn
+    revlog: List[Tuple[int, int, int, int, int, int, int]]
+    reps: int
+    last_answered_secs: int
+
+
+def replay(
+    scheduler: Scheduler,
+    state: CardState,
+    reviews: Iterable[Tuple[int, int]],
+    day_offset: int,
+    last_answered_secs: Optional[int] = None,
+    actual_gaps: bool = False,
+) -> ReplayResult:
+    """Run (timestamp, rating) pairs through the scheduler.
+
+    Reviews count as answered on time, unless ``actual_gaps`` is set: elapsed days
+    are then counted between the timestamps, across the day boundaries Anki uses.
+    ``day_offset`` is the timestamp at which the collection's days start.
+    """
+    revlog = []
+    reps = 0
+    for timestamp, rating in reviews:
+        if not actual_gaps:
+            elapsed_days = state.scheduled_days
+        elif last_answered_secs is None:
+            elapsed_days = 0
+        else:
+            elapsed_days = (timestamp - day_offset) // SECONDS_PER_DAY - (
+                last_answered_secs - day_offset
+            ) // SECONDS_PER_DAY
+        new_state = scheduler.next_state(state, rating, elapsed_days)
+
+        if state.kind == "review":
+            review_kind = REVLOG_REV
+        elif state.kind == "relearning":
+            review_kind = REVLOG_RELRN
+        else:
+            review_kind = REVLOG_LRN
+        revlog.append(
+            (
+                timestamp * 1000,
+                rating + 1,
+                new_state.interval,
+                state.interval,
+                int(round(new_state.ease_factor * 1000)),
+                REVIEW_MILLIS,
+                review_kind,
+            )
+        )
+        state = new_state
+        reps += 1
+        last_answered_secs = timestamp
+    return ReplayResult(state, revlog, reps, last_answered_secs or 0)
+
+
+class OfflineReplay:
+    """Replay review histories on cards of a collection without the backend."""
+
+    def __init__(
+        self,
+        col: Collection,
+        deck_id: int,
+        chunk_cards: int = CHUNK_CARDS,
+        actual_gaps: bool = False,
+    ):
+        self.col = col
+        # See replay(); otherwise cards are scheduled from the time of the import.
+        self.actual_gaps = actual_gaps
+        self.scheduler = Scheduler(
+            SchedulerParams.from_deck_config(col.decks.config_dict_for_deck_id(deck_id))
+        )
+        self.chunk_cards = chunk_cards
+        self._used_revlog_ids = set(col.db.list("select id from revlog"))
+        self._usn = col.usn()
+        self._revlog_rows: List[tuple] = []
+        self._cards: List[Card] = []
+        self._pending_ids: Set[int] = set()
+
+    @staticmethod
+    def supported(col: Collection) -> bool:
+        """FSRS scheduling is not ported; such collections need the backend replay."""
+        return not col.get_config("fsrs", False)
+
+    def _unique_revlog_id(self, revlog_id: int) -> int:
+        # Like the backend, bump colliding ids by a millisecond.
+        while revlog_id in self._used_revlog_ids:
+            revlog_id += 1
+        self._used_revlog_ids.add(revlog_id)
+        return revlog_id
+
+    def replay(
+        self,
+        card: Card,
+        reviews: Iterable[Tuple[int, int]],
+        since_millis: int = 0,
+    ) -> int:
+        """Record (timestamp, rating) reviews on the card and update its state.
+
+        The card's review log rows and new state are written with the rest of its
+        chunk, so call flush() once all cards have been replayed.
+        Returns the number of reviews recorded.
+        """
+        result = replay(
+            self.scheduler,
+            CardState.from_card(card),
+            reviews,
+            self.col.crt,
+            since_millis // 1000 if since_millis else None,
+            self.actual_gaps,
+        )
+        if not result.reps:
+            return 0
+
+        self._revlog_rows.extend(
+            (self._unique_revlog_id(row[0]), card.id, self._usn, *row[1:])
+            for row in result.revlog
+        )
+        self.apply_state(card, result)
+        self._cards.append(card)
+        self._pending_ids.add(card.id)
+        if len(self._cards) >= self.chunk_cards:
+            self.flush()
+        return result.reps
+
+    def stats(self) -> dict:
+        return self.scheduler.stats()
+
+    def pending(self, card_id: int) -> bool:
+        """Whether the card has a replayed state that isn't written yet."""
+        return card_id in self._pending_ids
+
+    def flush(self) -> None:
+        """Write the buffered review log rows and card states."""
+        if self._revlog_rows:
+            self.col.db.executemany(
+                "insert into revlog"
+                " (id, cid, usn, ease, ivl, lastIvl, factor, time, type)"
+                " values (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._revlog_rows,
+            )
+            self._revlog_rows = []
+        if self._cards:
+            self.col.update_cards(self._cards, skip_undo_entry=True)
+            self._cards = []
+            self._pending_ids.clear()
+
+    def apply_state(self, card: Card, result: ReplayResult) -> None:
+        state = result.state
+        if self.actual_gaps:
+            answered = result.last_answered_secs
+            answered_day = (answered - self.col.crt) // SECONDS_PER_DAY
+        else:
+            # Like the backend replay, which answers every review today
+            answered = int(time.time())
+            answered_day = self.col.sched.today
+        card.reps += result.reps
+        card.lapses = state.lapses
+
+        if state.kind == "review":
+            card.type = CARD_TYPE_REV
+            card.queue = QUEUE_TYPE_REV
+            card.ivl = state.scheduled_days
+            card.due = answered_day + state.scheduled_days
+            card.factor = int(round(state.ease_factor * 1000))
+            card.left = 0
+            return
+
+        card.type = (
+            CARD_TYPE_RELEARNING if state.kind == "relearning" else CARD_TYPE_LRN
+        )
+        card.left = state.remaining_steps
+        if state.kind == "relearning":
+            card.ivl = state.scheduled_days
+            card.factor = int(round(state.ease_factor * 1000))
+        if state.scheduled_secs >= SECONDS_PER_DAY:
+            card.queue = QUEUE_TYPE_DAY_LEARN_RELEARN
+            card.due = answered_day + state.scheduled_secs // SECONDS_PER_DAY
+        else:
+            card.queue = QUEUE_TYPE_LRN
+            card.due = answered + state.scheduled_secs
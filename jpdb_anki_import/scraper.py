@@ -1,33 +1,106 @@
 #!/usr/bin/env python
+import abc
+import collections
+import concurrent.futures
 import dataclasses
+import functools
+import http.client
+import itertools
+import json
 import os
 import re
 import sys
+import threading
 import time
-import urllib.error
 import urllib.parse
-import urllib.request
 
-from typing import Optional, List
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-from . import jpdb
-
-# vendor dependencies
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), "vendor"))
-import bs4
+from . import cache, connection, dictionary, jpdb, ratelimit, timing
 
+# vendor dependencies, imported when the first page is parsed (see _bs4)
+VENDOR_DIR = os.path.join(os.path.dirname(__file__), "vendor")
 
+JPDB_URL = "https://jpdb.io"
 MAX_RETRIES = 5
+# Vocabulary pages are only parsed as far as the sections lookup_word reads;
+# everything outside divs of these classes is skipped by the tree builder.
+WORD_SECTION_CLASSES = ["subsection-meanings", "card-sentence"]
+# Number of words looked up in parallel by JPDBScraper.lookup_words
+DEFAULT_CONCURRENCY = 4
+API_LOOKUP_PATH = "/api/v1/lookup-vocabulary"
+# Words resolved by a single API request
+API_BATCH_SIZE = 100
+API_FIELDS = ["vid", "part_of_speech", "meanings_chunks"]
+# Labels the vocabulary pages show for the API's part of speech codes. Words with
+# a code missing here are scraped from their page, so that all glossaries share
+# one format.
+API_PART_OF_SPEECH_LABELS = {
+    "n": "Noun",
+    "pn": "Pronoun",
+    "n-suf": "Noun suffix",
+    "n-pref": "Noun prefix",
+    "vs": "Suru verb",
+    "vk": "Kuru verb",
+    "v1": "Ichidan verb",
+    "v5": "Godan verb",
+    "vt": "Transitive verb",
+    "vi": "Intransitive verb",
+    "adj-i": "I-adjective",
+    "adj-na": "Na-adjective",
+    "adj-no": "No-adjective",
+    "adj-pn": "Pre-noun adjectival",
+    "adv": "Adverb",
+    "adv-to": "Adverb taking the 'to' particle",
+    "aux-v": "Auxiliary verb",
+    "conj": "Conjunction",
+    "cop": "Copula",
+    "ctr": "Counter",
+    "exp": "Expression",
+    "int": "Interjection",
+    "num": "Numeric",
+    "pref": "Prefix",
+    "prt": "Particle",
+    "suf": "Suffix",
+}
+# Words looked up in a local dictionary per batch, when no JPDB backend is set
+DICTIONARY_BATCH_SIZE = 100
+
+
+def _bs4():
+    """Import the vendored BeautifulSoup, which is slow to load, on first use."""
+    if VENDOR_DIR not in sys.path:
+        sys.path.insert(0, VENDOR_DIR)
+    import bs4
+
+    return bs4
+
+
+@functools.lru_cache(maxsize=None)
+def _word_sections():
+    return _bs4().SoupStrainer("div", class_=WORD_SECTION_CLASSES)
+
+
+# Fields of a Word that scraped_jpdb_field_mapping maps to note fields
+WORD_FIELDS = ("glossary", "notes", "sentence")
 
 
 @dataclasses.dataclass
 class Word:
-    glossary: str
+    glossary: Optional[str]
     notes: Optional[str]
     sentence: Optional[str]
+    # The fields the lookup knows. A backend that can't see some of them (the API
+    # has no custom meanings) leaves them out, and notes keep what they have there.
+    provided: FrozenSet[str] = frozenset(WORD_FIELDS)
 
     def as_dict(self):
-        return dataclasses.asdict(self)
+        return {name: getattr(self, name) for name in WORD_FIELDS}
+
+    def provided_fields(self) -> Dict[str, Optional[str]]:
+        return {
+            name: getattr(self, name) for name in WORD_FIELDS if name in self.provided
+        }
 
 
 class ParseError(Exception):
@@ -40,11 +113,205 @@ def strings_to_html_list(strings: List[str]) -> str:
     return f"<ol>{''.join(elements)}</ol>"
 
 
+def glossary_html(part_of_speech: Sequence[str], definitions: List[str]) -> str:
+    """Combine parts of speech and definitions into the glossary field."""
+    pos = ", ".join(part_of_speech)
+    definitions = strings_to_html_list(definitions)
+    return f'<div class="glossary"><p class="pos">{pos}</p>{definitions}</div>'
+
+
+class LookupBackend(abc.ABC):
+    """How a JPDBScraper looks words up on JPDB.
+
+    Backends send their requests through the scraper, so they share its connection
+    pool, rate limiter and profile.
+    """
+
+    # Number of words passed to one lookup() call
+    batch_size = 1
+
+    def __init__(self, jpdb_scraper: "JPDBScraper"):
+        self.scraper = jpdb_scraper
+
+    @abc.abstractmethod
+    def lookup(self, words: List[jpdb.Vocabulary]) -> List[Word]:
+        """Return the Word for each of the words, in the same order."""
+
+
+class HTMLBackend(LookupBackend):
+    """Scrape the vocabulary page of each word (see JPDBScraper.lookup_word)."""
+
+    def lookup(self, words: List[jpdb.Vocabulary]) -> List[Word]:
+        return [self.scraper.lookup_word(word) for word in words]
+
+
+class APIBackend(LookupBackend):
+    """Resolve words in batches with JPDB's lookup-vocabulary API.
+
+    The API identifies words by vid and sid, so words exported without a sid are
+    scraped from their page instead. It also doesn't return the custom meaning
+    and sentence of the user's card, so its Words only provide the glossary,
+    unless the word is in the scrape cache already.
+    """
+
+    batch_size = API_BATCH_SIZE
+
+    def __init__(self, jpdb_scraper: "JPDBScraper", api_key: str):
+        super().__init__(jpdb_scraper)
+        self._api_key = api_key
+        self._html = HTMLBackend(jpdb_scraper)
+
+    def lookup(self, words: List[jpdb.Vocabulary]) -> List[Word]:
+        results: List[Optional[Word]] = [None] * len(words)
+        from_api = []
+        for i, word in enumerate(words):
+            cached = self.scraper.cached_word(word)
+            if cached is not None:
+                results[i] = cached
+            elif word.sid is not None:
+                from_api.append(i)
+        if from_api:
+            found = self._lookup_vocabulary([words[i] for i in from_api])
+            for i, word in zip(from_api, found):
+                results[i] = word
+
+        for i, word in enumerate(words):
+            if results[i] is None:
+                # No sid, or unknown to the API
+                results[i] = self.scraper.lookup_word(word)
+        return results
+
+    def _lookup_vocabulary(self, words: List[jpdb.Vocabulary]) -> List[Optional[Word]]:
+        body = json.dumps(
+            {"list": [[word.vid, word.sid] for word in words], "fields": API_FIELDS}
+        ).encode("utf-8")
+        headers = {
+            "authorization": f"Bearer {self._api_key}",
+            "content-type": "application/json",
+            "accept": "application/json",
+            "accept-encoding": "gzip",
+        }
+        response = self.scraper.request(
+            "POST", API_LOOKUP_PATH, headers, body, operation="api_request"
+        )
+        try:
+            info = json.loads(response.body)["vocabulary_info"]
+        except (ValueError, KeyError) as e:
+            raise ParseError("unexpected lookup-vocabulary response") from e
+        if len(info) != len(words):
+            raise ParseError("lookup-vocabulary returned the wrong number of words")
+
+        found = []
+        for entry in info:
+            if entry is None:
+                found.append(None)
+                continue
+            _vid, part_of_speech, meanings = entry
+            labels = [API_PART_OF_SPEECH_LABELS.get(code) for code in part_of_speech]
+            if None in labels:
+                found.append(None)
+                continue
+            definitions = ["; ".join(chunks) for chunks in meanings]
+            found.append(
+                Word(
+                    glossary=glossary_html(labels, definitions),
+                    notes=None,
+                    sentence=None,
+                    provided=frozenset(["glossary"]),
+                )
+            )
+        return found
+
+
+class DictionaryBackend(LookupBackend):
+    """Take glossaries from a local dictionary (see dictionary.Dictionary).
+
+    The dictionary only has glossaries. If the import maps other fields as well
+    and there is a fallback backend, every word is also looked up with the
+    fallback, and only its glossary is replaced by the dictionary's. Otherwise
+    just the words missing from the dictionary go to the fallback; without one,
+    they provide no fields at all.
+    """
+
+    def __init__(
+        self,
+        jpdb_scraper: "JPDBScraper",
+        local_dictionary: dictionary.Dictionary,
+        fallback: Optional[LookupBackend] = None,
+        fields: Iterable[str] = WORD_FIELDS,
+    ):
+        super().__init__(jpdb_scraper)
+        self.dictionary = local_dictionary
+        self.fallback = fallback
+        self.merge = fallback is not None and any(f != "glossary" for f in fields)
+        self.batch_size = fallback.batch_size if fallback else DICTIONARY_BATCH_SIZE
+
+    def _glossary(self, word: jpdb.Vocabulary) -> Optional[str]:
+        entry = self.dictionary.lookup(word.spelling, word.reading)
+        return glossary_html(*entry) if entry is not None else None
+
+    def lookup(self, words: List[jpdb.Vocabulary]) -> List[Word]:
+        glossaries = [self._glossary(word) for word in words]
+        if self.merge:
+            return [
+                word
+                if glossary is None
+                else dataclasses.replace(
+                    word, glossary=glossary, provided=word.provided | {"glossary"}
+                )
+                for word, glossary in zip(self.fallback.lookup(words), glossaries)
+            ]
+
+        results: List[Optional[Word]] = [
+            None
+            if glossary is None
+            else Word(glossary, None, None, provided=frozenset(["glossary"]))
+            for glossary in glossaries
+        ]
+        missing = [i for i, word in enumerate(results) if word is None]
+        if missing and self.fallback is not None:
+            found = self.fallback.lookup([words[i] for i in missing])
+            for i, word in zip(missing, found):
+                results[i] = word
+        unknown = Word(None, None, None, provided=frozenset())
+        return [word or unknown for word in results]
+
+
 class JPDBScraper:
-    def __init__(self, cookie):
+    def __init__(
+        self,
+        cookie,
+        scrape_cache: Optional[cache.ScrapeCache] = None,
+        base_url: str = JPDB_URL,
+        rate_limiter: Optional[ratelimit.RateLimiter] = None,
+        revalidate: bool = False,
+        api_key: str = "",
+        local_dictionary: Optional[dictionary.Dictionary] = None,
+        fields: Iterable[str] = WORD_FIELDS,
+    ):
         self._session_cookie = cookie
-        self._http_client = None
+        self._http_client = connection.ConnectionPool(base_url)
+        self._rate_limiter = rate_limiter or ratelimit.RateLimiter()
+        self.profile = timing.ImportProfile()
         self._logged_in = False
+        self._cache = scrape_cache
+        # Check every cached word against JPDB with a conditional request, however
+        # fresh its cache entry is
+        self.revalidate = revalidate
+        self._lock = threading.Lock()
+        self.not_modified = 0
+        # Refreshes compare fields with what earlier scrapes of the pages wrote,
+        # so they read the pages rather than the API.
+        self.backend: LookupBackend = (
+            APIBackend(self, api_key)
+            if api_key and not revalidate
+            else HTMLBackend(self)
+        )
+        self._dictionary = local_dictionary
+        if local_dictionary is not None:
+            # Without a cookie or API key, JPDB is never asked.
+            fallback = self.backend if cookie or api_key else None
+            self.backend = DictionaryBackend(self, local_dictionary, fallback, fields)
 
     def _japanese_strings(self, tag_with_text):
         """Yield substrings of the japanese text markup without furigana."""
@@ -78,31 +345,116 @@ class JPDBScraper:
             "sec-fetch-dest": "document",
             "accept-language": "ja,en-GB;q=0.9,en;q=0.8",
             "cookie": self._session_cookie,
-            "if-none-match": "^^",
+            "accept-encoding": "gzip",
         }
 
-    def _word_soup(self, word: jpdb.Vocabulary) -> bs4.BeautifulSoup:
+    def _word_page(
+        self, word: jpdb.Vocabulary, headers: Optional[dict] = None
+    ) -> connection.Response:
         encoded_spelling = urllib.parse.quote(word.spelling, encoding="utf-8")
         encoded_reading = urllib.parse.quote(word.reading, encoding="utf-8")
-        url = f"https://jpdb.io/vocabulary/{word.vid}/{encoded_spelling}/{encoded_reading}?lang=english#a"
-        request = urllib.request.Request(
-            url=url,
-            method="GET",
-            headers=self._headers,
-        )
+        path = f"/vocabulary/{word.vid}/{encoded_spelling}/{encoded_reading}?lang=english"
+        return self.request("GET", path, headers or self._headers)
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        headers: dict,
+        body: Optional[bytes] = None,
+        operation: str = "scrape_request",
+    ) -> connection.Response:
+        """Send a request to JPDB under the rate limit, retrying failures.
+
+        Latencies are sampled in the profile under ``operation``.
+        """
         for i in range(MAX_RETRIES + 1):
+            self._rate_limiter.acquire()
             try:
-                with urllib.request.urlopen(request) as response:
-                    return bs4.BeautifulSoup(response.read(), "html.parser")
-            except urllib.error.URLError:
+                response = self._http_client.request(method, path, headers, body)
+                self.profile.sample(operation, response.latency)
+                if response.status in ratelimit.THROTTLED_STATUSES:
+                    retry_after = ratelimit.parse_retry_after(
+                        response.headers.get("retry-after")
+                    )
+                    self._rate_limiter.throttled(retry_after)
+                    if retry_after is not None and i < MAX_RETRIES:
+                        # The limiter holds every worker back until then.
+                        continue
+                    raise connection.HTTPError(response)
+                if response.status >= 400:
+                    raise connection.HTTPError(response)
+                self._rate_limiter.succeeded()
+                return response
+            except (OSError, http.client.HTTPException, connection.HTTPError):
                 if i == MAX_RETRIES:
                     raise
-                time.sleep(2**i)
+                time.sleep(ratelimit.backoff(i))
         # This should not be reachable
         raise ParseError("Failed to contact JPDB")
 
+    def cached_word(self, word: jpdb.Vocabulary) -> Optional[Word]:
+        """The cached Word for the word, unless the cache is off or revalidating."""
+        if self._cache is None or self.revalidate:
+            return None
+        cached = self._cache.get(word)
+        return Word(**cached) if cached is not None else None
+
     def lookup_word(self, word: jpdb.Vocabulary) -> Word:
-        soup = self._word_soup(word)
+        if self._cache is None:
+            return self._scrape_word(word)[0]
+
+        entry = None
+        if self.revalidate:
+            entry = self._cache.entry(word)
+        else:
+            cached = self._cache.get(word)
+            if cached is not None:
+                return Word(**cached)
+
+        scraped, response = self._scrape_word(word, entry)
+        if scraped is None:
+            self._cache.touch(word)
+            return Word(**entry.word)
+        self._cache.put(
+            word,
+            scraped.as_dict(),
+            response.headers.get("etag"),
+            response.headers.get("last-modified"),
+        )
+        return scraped
+
+    def _scrape_word(
+        self, word: jpdb.Vocabulary, entry: Optional[cache.Entry] = None
+    ) -> Tuple[Optional[Word], connection.Response]:
+        """Fetch and parse the word's page.
+
+        Given the cache entry of an earlier scrape, the page is only sent again if
+        it changed since; otherwise the returned Word is None.
+        """
+        headers = self._headers
+        if entry is not None:
+            if entry.etag:
+                headers["if-none-match"] = entry.etag
+            if entry.last_modified:
+                headers["if-modified-since"] = entry.last_modified
+        response = self._word_page(word, headers)
+        if response.status == 304 and entry is not None:
+            with self._lock:
+                self.not_modified += 1
+            return None, response
+        with self.profile.phase("html_parse"):
+            return self.parse_word(response.body), response
+
+    def parse_word(self, page: bytes, strain: bool = True) -> Word:
+        """Extract a Word from the HTML of a JPDB vocabulary page.
+
+        Only the sections the Word is read from are parsed, unless strain is False
+        (to compare against parsing the whole document).
+        """
+        bs4 = _bs4()
+        parse_only = _word_sections() if strain else None
+        soup = bs4.BeautifulSoup(page, "html.parser", parse_only=parse_only)
 
         # meanings
         meanings = soup.find("div", class_="subsection-meanings")
@@ -134,13 +486,66 @@ class JPDBScraper:
         else:
             sentence = None
 
-        # Combine parts of speech and definitions into the glossary field.
-        pos = ", ".join(pos_list)
-        definitions = strings_to_html_list(definitions)
-        glossary = f'<div class="glossary"><p class="pos">{pos}</p>{definitions}</div>'
-
         return Word(
-            glossary=glossary,
+            glossary=glossary_html(pos_list, definitions),
             notes=notes,
             sentence=sentence,
         )
+
+    def stats(self) -> dict:
+        """Counters describing the work done by this scraper so far."""
+        stats = self._http_client.stats()
+        stats["http_not_modified"] = self.not_modified
+        stats.update(self._rate_limiter.stats())
+        if self._cache is not None:
+            stats.update(self._cache.stats())
+        if self._dictionary is not None:
+            stats.update(self._dictionary.stats())
+        return stats
+
+    def close(self) -> None:
+        self._http_client.close()
+        if self._cache is not None:
+            self._cache.close()
+        if self._dictionary is not None:
+            self._dictionary.close()
+
+    def lookup_words(
+        self,
+        vocabulary: Iterable[jpdb.Vocabulary],
+        max_workers: int = DEFAULT_CONCURRENCY,
+    ) -> Iterator[Word]:
+        """Look up words on a pool of worker threads.
+
+        Words are handed to the backend in batches of its batch_size. Results are
+        yielded in the same order as ``vocabulary`` as soon as they are available. At
+        most ``2 * max_workers`` batches are in flight at any time, so the caller can
+        start consuming results before the whole vocabulary is done.
+        """
+        max_workers = max(1, max_workers)
+        batches = batches_of(vocabulary, self.backend.batch_size)
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="jpdb-scraper"
+        ) as executor:
+            pending = collections.deque()
+            try:
+                for batch in batches:
+                    pending.append(executor.submit(self.backend.lookup, batch))
+                    if len(pending) >= 2 * max_workers:
+                        yield from pending.popleft().result()
+                while pending:
+                    yield from pending.popleft().result()
+            finally:
+                # Don't wait on lookups nobody is going to consume (e.g. on cancel).
+                for future in pending:
+                    future.cancel()
+
+
+def batches_of(iterable: Iterable, size: int) -> Iterator[list]:
+    """Split iterable into lists of size items; the last one may be shorter."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,279 @@
+"""
+Import on several processes at once, for exports too large to replay on one core.
+
+The words that need a new note are split into shards by vid. Each shard is
+imported by a worker process into a temporary collection that has the target's
+note type (with the same id) and deck options, and exported as a package with its
+scheduling. The packages are then imported into the target collection one after
+another; the vids of their notes travel with them in their tags or vid field. Their
+new cards are then put in the order a serial import would give them. Words that
+already have a note are imported as usual afterwards, on the target collection
+itself.
+
+Only the command line uses this (see __main__); it needs Anki 23.10 or newer for
+its package options.
+"""
+
+import concurrent.futures
+import copy
+import dataclasses
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from anki.collection import (
+    Collection,
+    ExportAnkiPackageOptions,
+    ImportAnkiPackageOptions,
+    ImportAnkiPackageRequest,
+)
+from anki.decks import DeckId
+
+from . import config, importer, jpdb, progress, ratelimit, scraper
+
+# Stats of the workers that are added up for the whole import
+SUMMED_STATS = ("notes_created", "reviews_replayed", "http_requests")
+# Collection settings that change how reviews are scheduled
+SCHEDULING_CONFIG_KEYS = ("rollover", "fsrs")
+
+
+@dataclasses.dataclass
+class Shard:
+    """What a worker process needs to import one shard into a new collection."""
+
+    index: int
+    count: int
+    conf: config.Config
+    vids: FrozenSet[int]
+    note_type: dict
+    deck_name: str
+    deck_config: dict
+    collection_config: dict
+    directory: str
+
+    def __contains__(self, vocab: jpdb.Vocabulary) -> bool:
+        return vocab.vid % self.count == self.index and vocab.vid in self.vids
+
+
+class ShardError(Exception):
+    """A worker failed to import its shard.
+
+    Errors of the Anki backend can't be unpickled in the parent process, which
+    would only see a broken process pool, so workers raise this instead.
+    """
+
+
+def _add_note_type(path: str, note_type: dict) -> None:
+    """Add a copy of the note type, with the same id, to the new collection at path.
+
+    The backend only adds note types under a new id, so the id is changed in the
+    database afterwards. Keeping the id lets the package import match the note
+    type to the target's instead of adding a copy.
+    """
+    col = Collection(path)
+    try:
+        added = col.models.add_dict(dict(copy.deepcopy(note_type), id=0)).id
+        for table, column in (
+            ("notetypes", "id"),
+            ("fields", "ntid"),
+            ("templates", "ntid"),
+        ):
+            col.db.execute(
+                f"update {table} set {column} = ? where {column} = ?",
+                note_type["id"],
+                added,
+            )
+    finally:
+        # Reopened afterwards, so that the backend doesn't keep the old id cached.
+        col.close()
+
+
+def import_shard(shard: Shard) -> Tuple[str, dict, Set[str]]:
+    """Import the shard's words into a new collection and export it as a package.
+
+    Runs in a worker process. Returns the path of the package, the stats of the
+    import and the guids of its notes, which the package import keeps.
+    Failures are raised as ShardError.
+    """
+    try:
+        return _import_shard(shard)
+    except BaseException as error:
+        raise ShardError(
+            f"shard {shard.index}: {type(error).__name__}: {error}"
+        ) from error
+
+
+def _import_shard(shard: Shard) -> Tuple[str, dict, Set[str]]:
+    path = os.path.join(shard.directory, f"shard-{shard.index}.anki2")
+    _add_note_type(path, shard.note_type)
+    col = Collection(path)
+    try:
+        col.set_v3_scheduler(True)
+        for key, value in shard.collection_config.items():
+            col.set_config(key, value)
+        deck_id = col.decks.id(shard.deck_name)
+        deck_config = col.decks.config_dict_for_deck_id(deck_id)
+        col.decks.update_config(
+            dict(shard.deck_config, id=deck_config["id"], name=deck_config["name"])
+        )
+
+        conf = dataclasses.replace(
+            shard.conf,
+            deck_id=deck_id,
+            note_type_id=shard.note_type["id"],
+            duplicate_policy="create",
+            incremental=False,
+            resume=False,
+            refresh_scraped_fields=False,
+            report_file="",
+            profile_file="",
+        )
+        # The workers share JPDB's rate limit between them.
+        rate_limiter = ratelimit.RateLimiter(
+            rate=ratelimit.DEFAULT_RATE / shard.count,
+            max_rate=ratelimit.DEFAULT_MAX_RATE / shard.count,
+        )
+        jpdb_scraper = importer.create_scraper(conf, rate_limiter)
+        try:
+            shard_importer = importer.JPDBImporter(conf, col, jpdb_scraper)
+            total = sum(vid % shard.count == shard.index for vid in shard.vids)
+            stats = shard_importer.run(select=shard.__contains__, total=total)
+        finally:
+            if jpdb_scraper is not None:
+                jpdb_scraper.close()
+        guids = set(col.db.list("select guid from notes"))
+
+        package = os.path.join(shard.directory, f"shard-{shard.index}.apkg")
+        col.export_anki_package(
+            out_path=package,
+            options=ExportAnkiPackageOptions(
+                with_scheduling=True,
+                with_deck_configs=False,
+                with_media=False,
+                legacy=False,
+            ),
+            limit=None,
+        )
+        return package, stats, guids
+    finally:
+        col.close()
+
+
+def _order_new_cards(
+    col: Collection, note_vids: Dict[int, int], vids: List[int], first_position: int
+) -> None:
+    """Give the new cards of the merged notes the positions a serial import would
+    have: each shard numbers its own cards from 1, and the packages keep those."""
+    positions = {vid: first_position + index for index, vid in enumerate(vids)}
+    cards = []
+    for card_id, note_id in col.db.all("select id, nid from cards where type = 0"):
+        if note_id in note_vids:
+            card = col.get_card(card_id)
+            card.due = positions[note_vids[note_id]]
+            cards.append(card)
+    if cards:
+        col.update_cards(cards)
+    col.set_config("nextPos", first_position + len(vids))
+
+
+def import_sharded(
+    conf: config.Config,
+    col: Collection,
+    workers: int,
+    jpdb_scraper: Optional[scraper.JPDBScraper] = None,
+    progress_reporter: Optional[progress.ProgressReporter] = None,
+) -> dict:
+    """Import the review file into col on ``workers`` processes.
+
+    Resuming from a checkpoint is not supported in this mode.
+    """
+    reporter = progress_reporter or progress.ProgressReporter()
+    conf = dataclasses.replace(conf, resume=False)
+    start = time.perf_counter()
+
+    # Decide up front which words get new notes; only those are sharded.
+    planner = importer.JPDBImporter(conf, col)
+    existing, duplicate_index = planner.plan_context()
+    # In the order a serial import would create their notes
+    created_vids = []
+    words = 0
+    for vocab in jpdb.Vocabulary.iter_parse(conf.review_file):
+        words += 1
+        if planner.plan(vocab, existing, duplicate_index)[0] == "create":
+            created_vids.append(vocab.vid)
+    new_vids = frozenset(created_vids)
+
+    collection_config = {
+        key: col.get_config(key)
+        for key in SCHEDULING_CONFIG_KEYS
+        if col.get_config(key, None) is not None
+    }
+    shard_stats = []
+    shard_guids: Set[str] = set()
+    with tempfile.TemporaryDirectory() as directory:
+        shards = [
+            Shard(
+                index=index,
+                count=workers,
+                conf=conf,
+                vids=new_vids,
+                note_type=planner.note_model,
+                deck_name=col.decks.name(DeckId(conf.deck_id)),
+                deck_config=col.decks.config_dict_for_deck_id(DeckId(conf.deck_id)),
+                collection_config=collection_config,
+                directory=directory,
+            )
+            for index in range(workers)
+        ]
+        reporter.update(f"Importing {len(new_vids)} words on {workers} processes", 0)
+        # Spawned rather than forked: the parent holds an open collection.
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            results = list(executor.map(import_shard, shards))
+        shard_seconds = time.perf_counter() - start
+
+        merge_start = time.perf_counter()
+        first_position = col.get_config("nextPos", 1)
+        for index, (package, stats, guids) in enumerate(results):
+            reporter.update("Merging shards", index, workers)
+            col.import_anki_package(
+                ImportAnkiPackageRequest(
+                    package_path=package,
+                    options=ImportAnkiPackageOptions(
+                        with_scheduling=True, with_deck_configs=False
+                    ),
+                )
+            )
+            shard_guids.update(guids)
+            shard_stats.append(stats)
+        shard_notes = {
+            note_id
+            for note_id, guid in col.db.all("select id, guid from notes")
+            if guid in shard_guids
+        }
+        note_vids = {
+            note_id: vid
+            for vid, note_id in planner.recorded_vids()
+            if note_id in shard_notes
+        }
+        _order_new_cards(col, note_vids, created_vids, first_position)
+        merge_seconds = time.perf_counter() - merge_start
+
+    # Words that already have a note are merged into it as usual.
+    stats = importer.JPDBImporter(conf, col, jpdb_scraper, reporter).run(
+        select=lambda vocab: vocab.vid not in new_vids, total=words - len(new_vids)
+    )
+    for key in SUMMED_STATS:
+        if key in stats:
+            stats[key] += sum(shard.get(key, 0) for shard in shard_stats)
+    elapsed = time.perf_counter() - start
+    stats["notes_per_second"] = round(stats["notes_created"] / elapsed, 2)
+    stats["reviews_per_second"] = round(stats["reviews_replayed"] / elapsed, 2)
+    stats["workers"] = workers
+    stats["shard_seconds"] = round(shard_seconds, 3)
+    stats["merge_seconds"] = round(merge_seconds, 3)
+    stats["seconds"] = round(elapsed, 3)
+    return stats
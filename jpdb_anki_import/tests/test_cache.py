@@ -0,0 +1,32 @@
+import time
+
+from jpdb_anki_import import cache, jpdb
+
+
+def vocab(vid: int) -> jpdb.Vocabulary:
+    return jpdb.Vocabulary(vid=vid, spelling=f"word{vid}", reading=f"reading{vid}")
+
+
+def test_eviction_keeps_expired_words_with_validators(tmp_path, monkeypatch):
+    scrape_cache = cache.ScrapeCache(str(tmp_path / "cache.sqlite3"), max_entries=3)
+    scrape_cache.put(vocab(1), {"meaning": "one"})
+    scrape_cache.put(vocab(2), {"meaning": "two"}, etag='"2"')
+    scrape_cache.put(vocab(3), {"meaning": "three"}, last_modified="yesterday")
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + cache.DEFAULT_TTL_SECONDS + 1)
+    scrape_cache._evict()
+
+    assert scrape_cache.get(vocab(2)) is None
+    assert scrape_cache.entry(vocab(1)) is None
+    assert scrape_cache.entry(vocab(2)).etag == '"2"'
+    assert scrape_cache.entry(vocab(3)).last_modified == "yesterday"
+
+    # Beyond max_entries, the oldest words go whatever their validators.
+    scrape_cache.put(vocab(4), {"meaning": "four"})
+    scrape_cache.put(vocab(5), {"meaning": "five"})
+    scrape_cache.close()
+    scrape_cache = cache.ScrapeCache(str(tmp_path / "cache.sqlite3"))
+    assert scrape_cache.entry(vocab(2)) is None
+    for vid in (3, 4, 5):
+        assert scrape_cache.entry(vocab(vid)) is not None
+    scrape_cache.close()
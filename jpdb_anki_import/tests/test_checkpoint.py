@@ -0,0 +1,68 @@
+import os
+
+from jpdb_anki_import import checkpoint
+
+
+def test_record_appends_and_load_replays(tmp_path):
+    path = os.path.join(tmp_path, "collection.anki2.jpdb-import.json")
+    journal = checkpoint.Checkpoint(path, "reviews.json")
+    journal.record([(1, 10), (2, None)])
+    journal.record([(3, 30)])
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 2
+
+    loaded = checkpoint.Checkpoint.load(path, "reviews.json")
+    assert loaded.notes == {1: 10, 2: None, 3: 30}
+    assert len(checkpoint.Checkpoint.load(path, "other.json")) == 0
+
+
+def test_batches_only_append(tmp_path):
+    path = os.path.join(tmp_path, "journal.json")
+    journal = checkpoint.Checkpoint(path, "reviews.json")
+    journal.record([(0, 0)])
+    size = os.path.getsize(path)
+    for vid in range(1, 100):
+        journal.record([(vid, vid)])
+        # Each batch grows the file by its own line, not by the whole map.
+        assert os.path.getsize(path) - size < 64
+        size = os.path.getsize(path)
+
+
+def test_torn_line_is_dropped(tmp_path):
+    path = os.path.join(tmp_path, "journal.json")
+    journal = checkpoint.Checkpoint(path, "reviews.json")
+    journal.record([(1, 10)])
+    journal.record([(2, 20)])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"vids":[3],"note_ids":[30]}')
+
+    loaded = checkpoint.Checkpoint.load(path, "reviews.json")
+    assert loaded.notes == {1: 10, 2: 20}
+    loaded.record([(4, 40)])
+    assert checkpoint.Checkpoint.load(path, "reviews.json").notes == {
+        1: 10,
+        2: 20,
+        4: 40,
+    }
+
+
+def test_load_compacts_long_journals(tmp_path):
+    path = os.path.join(tmp_path, "journal.json")
+    journal = checkpoint.Checkpoint(path, "reviews.json")
+    for vid in range(checkpoint.COMPACT_BATCHES + 1):
+        journal.record([(vid, vid)])
+
+    loaded = checkpoint.Checkpoint.load(path, "reviews.json")
+    with open(path, encoding="utf-8") as f:
+        assert len(f.readlines()) == 1
+    assert loaded.notes == journal.notes
+
+
+def test_clear_restarts_the_journal(tmp_path):
+    path = os.path.join(tmp_path, "journal.json")
+    journal = checkpoint.Checkpoint(path, "reviews.json")
+    journal.record([(1, 10)])
+    journal.clear()
+    assert not os.path.exists(path)
+    journal.record([(2, 20)])
+    assert checkpoint.Checkpoint.load(path, "reviews.json").notes == {2: 20}
@@ -0,0 +1,65 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("anki")
+
+
+def _import(col, export: str, **options) -> dict:
+    from jpdb_anki_import import config, importer
+
+    note_type = col.models.by_name("Basic (and reversed card)")
+    conf = config.Config(
+        review_file=export,
+        deck_id=col.decks.id("JPDB"),
+        note_type_id=note_type["id"],
+        jp2en_card_name="Card 1",
+        en2jp_card_name="Card 2",
+        **options,
+    )
+    return importer.JPDBImporter(conf, col).run()
+
+
+@pytest.mark.parametrize("vid_field", ["", "VID"])
+def test_incremental_import_finds_notes_by_vid(tmp_path, vid_field):
+    from anki.collection import Collection
+
+    from benchmarks import synthetic
+    from jpdb_anki_import import importer
+
+    export = os.path.join(tmp_path, "export.json")
+    synthetic.generate_export(export, 30, 4.0, seed=3)
+    col = Collection(os.path.join(tmp_path, "collection.anki2"))
+    try:
+        if vid_field:
+            note_type = col.models.by_name("Basic (and reversed card)")
+            col.models.add_field(note_type, col.models.new_field(vid_field))
+            col.models.update_dict(note_type)
+        first = _import(col, export, vid_field=vid_field)
+        reviews = col.db.scalar("select count() from revlog")
+        again = _import(col, export, vid_field=vid_field, incremental=True)
+
+        assert first["notes_created"] == 30
+        assert again["notes_created"] == 0
+        # Notes without newer reviews are left alone.
+        assert again["notes_updated"] == 0
+        assert again["notes_unchanged"] == 30
+        assert col.db.scalar("select count() from revlog") == reviews
+        tagged = col.find_notes(f"tag:{importer.VID_TAG_PREFIX}*")
+        assert len(tagged) == (0 if vid_field else 30)
+
+        # A newer review of one word is replayed onto its note only.
+        with open(export, encoding="utf-8") as export_file:
+            data = json.load(export_file)
+        card = data["cards_vocabulary_jp_en"][0]
+        newest = max(review["timestamp"] for review in card["reviews"])
+        card["reviews"].append({"timestamp": newest + 86400, "grade": "okay"})
+        with open(export, "w", encoding="utf-8") as export_file:
+            json.dump(data, export_file)
+        latest = _import(col, export, vid_field=vid_field, incremental=True)
+        assert latest["notes_updated"] == 1
+        assert latest["notes_unchanged"] == 29
+        assert col.db.scalar("select count() from revlog") == reviews + 1
+    finally:
+        col.close()
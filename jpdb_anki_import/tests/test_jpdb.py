@@ -0,0 +1,74 @@
+import collections
+import io
+import json
+
+import pytest
+
+from jpdb_anki_import import jpdb
+
+
+def _items(document: str, chunk_size: int, monkeypatch) -> list:
+    monkeypatch.setattr(jpdb, "CHUNK_SIZE", chunk_size)
+    return list(jpdb._iter_array_items(io.StringIO(document), jpdb.DIRECTIONS))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1 << 16])
+def test_array_items_across_chunk_boundaries(chunk_size, monkeypatch):
+    document = json.dumps(
+        {
+            "before": [],
+            "cards_vocabulary_jp_en": [{"vid": 12345}, {"vid": [1, 2.5e10]}],
+            "object": {"key": [1, 2]},
+            "number": 1234567,
+            "cards_vocabulary_en_jp": [],
+        }
+    )
+    assert _items(document, chunk_size, monkeypatch) == [
+        ("cards_vocabulary_jp_en", {"vid": 12345}),
+        ("cards_vocabulary_jp_en", {"vid": [1, 2.5e10]}),
+    ]
+    assert _items("{}", chunk_size, monkeypatch) == []
+
+
+class CountingReader(io.StringIO):
+    """Counts the chunks read from it."""
+
+    reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+def _reads_per_item(document: str) -> list:
+    """How many chunks had been read when each item was yielded."""
+    reader = CountingReader(document)
+    return [reader.reads for _ in jpdb._iter_array_items(reader, jpdb.DIRECTIONS)]
+
+
+def test_items_are_yielded_as_their_chunk_is_read(monkeypatch):
+    monkeypatch.setattr(jpdb, "CHUNK_SIZE", 64)
+    items = [{"vid": vid, "reviews": []} for vid in range(100, 200)]
+    document = json.dumps({"cards_vocabulary_jp_en": items})
+    item_length = len(json.dumps(items[0]) + ", ")
+
+    reads = _reads_per_item(document)
+    assert len(reads) == len(items)
+    # Every chunk yields the items it completes, rather than the whole array being
+    # read first.
+    items_per_chunk = collections.Counter(reads)
+    assert len(items_per_chunk) >= len(document) // 64 - 1
+    assert max(items_per_chunk.values()) <= 64 // item_length + 1
+
+
+def test_large_skipped_values_take_few_reads(monkeypatch):
+    monkeypatch.setattr(jpdb, "CHUNK_SIZE", 1024)
+    document = json.dumps(
+        {"big_string": "y" * (1 << 20), "cards_vocabulary_jp_en": [{"vid": 1}]}
+    )
+    reads = _reads_per_item(document)
+    assert len(reads) == 1
+    # The unread buffer doubles on each failed decode, so the string is decoded
+    # about log2(1M / 1K) = 10 times rather than once per chunk, which would take
+    # quadratic time.
+    assert reads[0] <= 15
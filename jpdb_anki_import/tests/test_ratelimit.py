@@ -0,0 +1,74 @@
+import concurrent.futures
+import email.utils
+import time
+
+import pytest
+
+from benchmarks import stub_server
+from jpdb_anki_import import ratelimit, scraper
+
+PAGE = "/vocabulary/1/kotoba/kotoba"
+
+
+def http_date(seconds_from_now: float) -> str:
+    return email.utils.formatdate(time.time() + seconds_from_now, usegmt=True)
+
+
+def test_parse_retry_after():
+    assert ratelimit.parse_retry_after("2") == 2.0
+    assert ratelimit.parse_retry_after(http_date(10)) == pytest.approx(10, abs=1.5)
+    assert ratelimit.parse_retry_after(http_date(-10)) == 0.0
+    assert ratelimit.parse_retry_after("soon") is None
+    assert ratelimit.parse_retry_after(None) is None
+
+
+@pytest.mark.parametrize(
+    "status, retry_after",
+    [(429, lambda: "1"), (503, lambda: http_date(2)), (503, lambda: "1")],
+    ids=["429-seconds", "503-http-date", "503-seconds"],
+)
+def test_request_retries_after_throttling(status, retry_after):
+    limiter = ratelimit.RateLimiter(rate=8.0)
+    with stub_server.StubServer() as server:
+        server.throttle = [(status, retry_after())]
+        jpdb_scraper = scraper.JPDBScraper("", None, server.url, limiter)
+        response = jpdb_scraper.request("GET", PAGE, {})
+
+    assert response.status == 200
+    assert server.requests == 2
+    # The retry waited out Retry-After; an HTTP date only has whole seconds.
+    assert server.request_times[1] - server.request_times[0] >= 0.9
+    assert limiter.throttled_count == 1
+    halved = 8.0 * ratelimit.RATE_DECREASE
+    assert limiter.rate == pytest.approx(halved + ratelimit.RATE_INCREASE)
+
+
+def test_retry_after_blocks_every_worker():
+    limiter = ratelimit.RateLimiter(rate=10.0, burst=1)
+    with stub_server.StubServer() as server:
+        server.throttle = [(429, "1")]
+        jpdb_scraper = scraper.JPDBScraper("", None, server.url, limiter)
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            responses = list(
+                executor.map(lambda _: jpdb_scraper.request("GET", PAGE, {}), range(4))
+            )
+
+    assert [response.status for response in responses] == [200] * 4
+    # The throttled request plus one per worker
+    assert server.requests == 5
+    first, *others = server.request_times
+    # With a burst of 1, the other workers are only let through a token (0.1s)
+    # after the first request, by which time its 429 has paused them all.
+    assert min(others) - first >= 1.0
+    assert limiter.throttled_count == 1
+
+
+def test_throttling_halves_the_rate():
+    limiter = ratelimit.RateLimiter(rate=4.0)
+    limiter.throttled()
+    assert limiter.rate == 4.0 * ratelimit.RATE_DECREASE
+    limiter.throttled()
+    assert limiter.rate == 1.0
+    for _ in range(10):
+        limiter.throttled()
+    assert limiter.rate == ratelimit.MIN_RATE
@@ -0,0 +1,130 @@
+import os
+
+import pytest
+
+from jpdb_anki_import import scheduling
+from jpdb_anki_import.scheduling import AGAIN, EASY, GOOD, HARD, CardState
+
+DAY = scheduling.SECONDS_PER_DAY
+
+# Expected values follow rslib's scheduler/states for the default deck options:
+# learning steps 1m 10m, graduating intervals 1 and 4 days, starting ease 250%,
+# easy bonus 130%, hard interval 120%, relearning step 10m, new interval 0%.
+
+
+@pytest.fixture
+def scheduler():
+    return scheduling.Scheduler(scheduling.SchedulerParams())
+
+
+def test_new_card_graduates_and_grows(scheduler):
+    reviews = [(0, GOOD), (1000, GOOD), (DAY + 1000, GOOD), (4 * DAY, GOOD)]
+    reviews.append((12 * DAY, GOOD))
+    result = scheduling.replay(scheduler, CardState(), reviews, 0)
+    # (ease, ivl, lastIvl, factor, type) of each review log row
+    assert [(row[1], row[2], row[3], row[4], row[6]) for row in result.revlog] == [
+        (3, -600, 0, 0, scheduling.REVLOG_LRN),
+        (3, 1, -600, 2500, scheduling.REVLOG_LRN),
+        (3, 3, 1, 2500, scheduling.REVLOG_REV),
+        (3, 8, 3, 2500, scheduling.REVLOG_REV),
+        (3, 20, 8, 2500, scheduling.REVLOG_REV),
+    ]
+    assert result.state == CardState("review", scheduled_days=20, ease_factor=2.5)
+
+
+def test_learning_answers(scheduler):
+    assert scheduler.next_state(CardState(), HARD, 0) == CardState(
+        "learning", remaining_steps=2, scheduled_secs=330
+    )
+    assert scheduler.next_state(CardState(), AGAIN, 0) == CardState(
+        "learning", remaining_steps=2, scheduled_secs=60
+    )
+    assert scheduler.next_state(CardState(), EASY, 0) == CardState(
+        "review", scheduled_days=4, ease_factor=2.5
+    )
+
+
+def test_repeats_move_through_learning_steps(scheduler):
+    # Answers a second apart still advance the steps.
+    reviews = [(0, AGAIN), (1, GOOD), (2, GOOD)]
+    result = scheduling.replay(scheduler, CardState(), reviews, 0)
+    assert result.state == CardState("review", scheduled_days=1, ease_factor=2.5)
+    result = scheduling.replay(scheduler, CardState(), [(0, AGAIN)], 0)
+    assert result.state.kind == "learning"
+
+
+def test_review_intervals_when_late(scheduler):
+    state = CardState("review", scheduled_days=10, ease_factor=2.5)
+    # Two days late: hard 12, good (10 + 1) * 2.5 = 27.5, easy 12 * 2.5 * 1.3 = 39
+    assert scheduler.next_state(state, HARD, 12).scheduled_days == 12
+    assert scheduler.next_state(state, GOOD, 12).scheduled_days == 28
+    assert scheduler.next_state(state, EASY, 12).scheduled_days == 39
+    assert scheduler.next_state(state, HARD, 12).ease_factor == pytest.approx(2.35)
+    assert scheduler.next_state(state, EASY, 12).ease_factor == pytest.approx(2.65)
+
+
+def test_intervals_round_half_up(scheduler):
+    # 9 * 2.5 = 22.5 rounds up like Rust's f32::round, not to even.
+    state = CardState("review", scheduled_days=9, ease_factor=2.5)
+    assert scheduler.next_state(state, GOOD, 9).scheduled_days == 23
+
+
+def test_review_intervals_when_early(scheduler):
+    state = CardState("review", scheduled_days=8, ease_factor=2.5)
+    assert scheduler.next_state(state, HARD, 4).scheduled_days == 5
+    assert scheduler.next_state(state, GOOD, 4).scheduled_days == 10
+    assert scheduler.next_state(state, EASY, 4).scheduled_days == 12
+
+
+def test_lapse_and_relearning(scheduler):
+    lapsed = scheduler.next_state(
+        CardState("review", scheduled_days=20, ease_factor=2.5), AGAIN, 20
+    )
+    assert lapsed == CardState(
+        "relearning",
+        remaining_steps=1,
+        scheduled_secs=600,
+        scheduled_days=1,
+        ease_factor=pytest.approx(2.3),
+        lapses=1,
+    )
+    relearnt = scheduler.next_state(lapsed, GOOD, 0)
+    assert (relearnt.kind, relearnt.scheduled_days, relearnt.lapses) == ("review", 1, 1)
+    assert scheduler.next_state(relearnt, GOOD, 1).scheduled_days == 3
+
+
+def test_ease_never_drops_below_minimum(scheduler):
+    state = CardState("review", scheduled_days=1, ease_factor=1.3)
+    assert scheduler.next_state(state, HARD, 1).ease_factor == 1.3
+    assert scheduler.next_state(state, AGAIN, 1).ease_factor == 1.3
+
+
+def test_memoized_transitions_match(scheduler):
+    unmemoized = scheduling.Scheduler(scheduler.params)
+    state = CardState()
+    for elapsed, rating in [(0, GOOD), (0, GOOD), (1, GOOD), (3, AGAIN), (0, GOOD)]:
+        expected = unmemoized._next_state(state, rating, elapsed)
+        assert scheduler.next_state(state, rating, elapsed) == expected
+        assert scheduler.next_state(state, rating, elapsed) == expected
+        state = expected
+    assert scheduler.stats()["transition_cache"]["hits"] == 5
+
+
+def test_fuzz_bounds():
+    assert scheduling.fuzz_bounds(2.0, 1, 36500) == (2, 2)
+    assert scheduling.fuzz_bounds(10.0, 1, 36500) == (8, 12)
+    assert scheduling.fuzz_bounds(100.0, 1, 36500) == (93, 107)
+    assert scheduling.fuzz_bounds(10.0, 11, 36500) == (11, 13)
+
+
+def test_interval_range(scheduler):
+    ratings = (HARD, GOOD, EASY)
+    state = CardState("review", scheduled_days=10, ease_factor=2.5)
+    ranges = [scheduler.interval_range(state, rating, 10) for rating in ratings]
+    assert ranges == [(11, 14), (22, 28), (29, 36)]
+    # Each minimum is a day longer than the fuzzed interval of the previous answer,
+    # which may be anywhere in its range.
+    state = CardState("review", scheduled_days=2, ease_factor=1.3)
+    ranges = [scheduler.interval_range(state, rating, 2) for rating in ratings]
+    assert ranges == [(3, 4), (4, 6), (5, 9)]
+    assert scheduler.interval_range(state, AGAIN, 2) == (-600, -600)
@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from jpdb_anki_import import scraper
+
+try:
+    scraper._bs4()
+except ImportError:
+    pytest.skip("BeautifulSoup isn't installed or vendored", allow_module_level=True)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+GLOSSARY = (
+    '<div class="glossary"><p class="pos">Noun</p><ol>'
+    "<li>word; phrase; expression; term</li>"
+    "<li>speech; (spoken)  language</li>"
+    "<li>manner of speaking;  語  use</li>"
+    "</ol></div>"
+)
+NOTES = "My mnemonic: <b>言</b> (say) + <i>葉</i> (leaves)"
+SENTENCE = "言葉を選んで話してください。"
+
+
+def fixture_page(name: str) -> bytes:
+    with open(os.path.join(FIXTURES, name), "rb") as page:
+        return page.read()
+
+
+@pytest.mark.parametrize(
+    "name, expected",
+    [
+        ("vocabulary_custom.html", scraper.Word(GLOSSARY, NOTES, SENTENCE)),
+        ("vocabulary_sentence.html", scraper.Word(GLOSSARY, None, SENTENCE)),
+        ("vocabulary_plain.html", scraper.Word(GLOSSARY, None, None)),
+    ],
+)
+def test_strained_parse_matches_full_parse(name, expected):
+    jpdb_scraper = scraper.JPDBScraper("")
+    page = fixture_page(name)
+    assert jpdb_scraper.parse_word(page) == expected
+    assert jpdb_scraper.parse_word(page, strain=False) == expected
+
+
+def test_page_without_meanings_is_an_error():
+    with pytest.raises(scraper.ParseError):
+        scraper.JPDBScraper("").parse_word(b"<html><body>Not found</body></html>")
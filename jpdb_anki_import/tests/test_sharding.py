@@ -0,0 +1,41 @@
+import os
+
+import pytest
+
+pytest.importorskip("anki")
+
+
+def test_sharded_import_matches_serial_import(tmp_path):
+    from anki.collection import Collection
+
+    from benchmarks import synthetic, validate_replay
+
+    export = os.path.join(tmp_path, "export.json")
+    synthetic.generate_export(export, 40, 6.0, seed=2)
+    serial_path = os.path.join(tmp_path, "serial.anki2")
+    sharded_path = os.path.join(tmp_path, "sharded.anki2")
+    serial_stats, serial = validate_replay.import_export(
+        serial_path, export, "anki"
+    )
+    stats, sharded = validate_replay.import_export(
+        sharded_path, export, "anki", workers=2
+    )
+
+    assert stats["workers"] == 2
+    assert stats["notes_created"] == 40
+    assert sharded.keys() == serial.keys()
+    slack = serial_stats["seconds"] + stats["seconds"]
+    for key, expected in serial.items():
+        for field in validate_replay.EXACT_FIELDS:
+            assert sharded[key][field] == expected[field], (key, field)
+        # New cards keep the order of a serial import, too.
+        assert validate_replay.due_matches(expected, sharded[key], slack), key
+
+    # The shards' notes use the target's note type rather than an imported copy.
+    col = Collection(sharded_path)
+    try:
+        names = [entry.name for entry in col.models.all_names_and_ids()]
+        assert not any(name.endswith("+") for name in names), names
+        assert col.db.scalar("select count(distinct mid) from notes") == 1
+    finally:
+        col.close()
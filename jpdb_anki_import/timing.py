@@ -0,0 +1,99 @@
+"""
+Wall time instrumentation for the phases of an import.
+"""
+
+import array
+import contextlib
+import threading
+import time
+from typing import Dict, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+def percentile(ordered, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class ImportProfile:
+    """Cumulative seconds and counts per phase, and latency samples per operation.
+
+    Safe to share between the importer and the scraper's worker threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seconds: Dict[str, float] = {}
+        self._counts: Dict[str, int] = {}
+        self._samples: Dict[str, array.array] = {}
+
+    def add(self, phase: str, seconds: float, count: int = 1) -> None:
+        with self._lock:
+            self._seconds[phase] = self._seconds.get(phase, 0.0) + seconds
+            self._counts[phase] = self._counts.get(phase, 0) + count
+
+    def sample(self, operation: str, seconds: float) -> None:
+        """Record one latency sample, which also counts towards its phase."""
+        with self._lock:
+            samples = self._samples.get(operation)
+            if samples is None:
+                samples = self._samples[operation] = array.array("d")
+            samples.append(seconds)
+        self.add(operation, seconds)
+
+    @contextlib.contextmanager
+    def phase(self, phase: str, count: int = 1) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start, count)
+
+    def iterate(self, phase: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Yield from iterable, counting the time spent producing each item."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(phase, time.perf_counter() - start, 0)
+                return
+            self.add(phase, time.perf_counter() - start)
+            yield item
+
+    def seconds(self, phase: str) -> float:
+        return self._seconds.get(phase, 0.0)
+
+    def merge(self, other: "ImportProfile") -> None:
+        with other._lock:
+            seconds = dict(other._seconds)
+            counts = dict(other._counts)
+            samples = {name: array.array("d", s) for name, s in other._samples.items()}
+        with self._lock:
+            for phase, value in seconds.items():
+                self._seconds[phase] = self._seconds.get(phase, 0.0) + value
+                self._counts[phase] = self._counts.get(phase, 0) + counts[phase]
+            for operation, values in samples.items():
+                self._samples.setdefault(operation, array.array("d")).extend(values)
+
+    def report(self) -> dict:
+        with self._lock:
+            phases = {
+                phase: {"seconds": round(seconds, 4), "count": self._counts[phase]}
+                for phase, seconds in self._seconds.items()
+            }
+            latencies = {}
+            for operation, samples in self._samples.items():
+                ordered = sorted(samples)
+                latencies[operation] = {
+                    "count": len(ordered),
+                    "p50": percentile(ordered, 0.5),
+                    "p95": percentile(ordered, 0.95),
+                    "max": ordered[-1] if ordered else 0.0,
+                }
+        return {"phases": phases, "latencies": latencies}